@@ -0,0 +1,82 @@
+# Debug file measuring a run of a Dililatum game for benchmarks/run.py.
+# Use it with -d and give it an -a out=FILE argument; results are
+# written to FILE as JSON when the world stops running. The first
+# warmup=N frames (default 10) are not measured.
+#
+# Python 2 cannot count allocations directly. Instead, automatic
+# garbage collection is turned off while measuring, so that the count
+# of the youngest generation of the garbage collector is the number of
+# objects tracked by it that were created and not freed again. The
+# number of objects in reference cycles is found by collecting at the
+# end.
+
+import gc
+import json
+import resource
+import time
+
+state = {}
+
+def get_argument(world, name, default):
+    for a in world.sys.etc.arguments:
+        if a.startswith(name + '='):
+            return type(default)(a[len(name) + 1:])
+    return default
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    i = int(round(p / 100.0 * (len(values) - 1)))
+    return values[i]
+
+def start(event):
+    world = event.args[0]
+    state['warmup'] = get_argument(world, 'warmup', 10)
+    state['frame'] = 0
+    state['times'] = []
+    state['allocations'] = []
+    gc.collect()
+
+def before_frame(event):
+    state['frame'] += 1
+    if state['frame'] == state['warmup'] + 1:
+        gc.collect()
+        gc.disable()
+    state['count'] = gc.get_count()[0]
+    state['started'] = time.time()
+
+def after_frame(event):
+    t = time.time() - state['started']
+    if state['frame'] > state['warmup']:
+        state['times'].append(t * 1000)
+        state['allocations'].append(gc.get_count()[0] - state['count'])
+
+def stop(event):
+    world = event.args[0]
+    gc.enable()
+    cyclic = gc.collect()
+    times = state['times']
+    allocations = state['allocations']
+    results = {
+        'frames': len(times),
+        'mean': sum(times) / max(1, len(times)),
+        'p50': percentile(times, 50),
+        'p95': percentile(times, 95),
+        'p99': percentile(times, 99),
+        'max': max(times or [0]),
+        'allocations_per_frame': float(sum(allocations)) /
+            max(1, len(allocations)),
+        'cyclic_garbage': cyclic,
+        # Kilobytes on Linux
+        'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    }
+    f = open(get_argument(world, 'out', 'benchmark.json'), 'w')
+    json.dump(results, f)
+    f.close()
+
+def main():
+    action('beforeworldrun', start)
+    action('beforegameloop', before_frame)
+    action('aftergameloop', after_frame)
+    action('afterworldrun', stop)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Dililatum: a quest system for simple RPGs
+# Copyright (C) 2010  Niels G. W. Serup
+
+# This file is part of Dililatum.
+#
+# Dililatum is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dililatum is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dililatum.  If not, see <http://www.gnu.org/licenses/>.
+
+##[ Name        ]## run
+##[ Maintainer  ]## Niels G. W. Serup <ngws@metanohi.name>
+##[ Description ]## Runs the frame time benchmarks of Dililatum
+
+import sys
+import os
+import json
+import tempfile
+import subprocess
+from optparse import OptionParser
+
+here = os.path.dirname(os.path.abspath(__file__))
+dililatum = os.path.join(os.path.dirname(here), 'bin', 'dililatum')
+synthetic = os.path.join(here, 'synthetic')
+probe = os.path.join(here, 'probe.py')
+
+# Each scenario changes one thing of a small default world
+DEFAULTS = dict(chars=10, objs=100, zoom=1, text=0)
+SCENARIOS = []
+for n in 1, 10, 100, 500:
+    SCENARIOS.append(('chars-%d' % n, dict(DEFAULTS, chars=n)))
+for n in 10, 100, 1000, 5000:
+    SCENARIOS.append(('objs-%d' % n, dict(DEFAULTS, objs=n)))
+for z in 0.5, 1.5, 2:
+    SCENARIOS.append(('zoom-%s' % z, dict(DEFAULTS, zoom=z)))
+for n in 100, 1000:
+    SCENARIOS.append(('text-%d' % n, dict(DEFAULTS, text=n)))
+
+# Metrics where larger numbers are worse, compared against a baseline,
+# and how much they must change before anything is flagged, so that
+# noise in tiny numbers is not taken for regressions
+COMPARED = dict(p50=0.25, p95=0.5, p99=1.0, allocations_per_frame=5,
+                peak_rss=1024)
+
+parser = OptionParser(
+    usage='Usage: %prog [OPTION]... [SCENARIO]...',
+    description='Runs Dililatum headless on synthetic games and reports \
+frame times, allocations and memory use as JSON. Runs all scenarios \
+unless some are named.')
+parser.add_option('-n', '--frames', dest='frames', type='int', default=300,
+                  metavar='NUMBER',
+                  help='number of frames to run every scenario for (default is 300)')
+parser.add_option('-o', '--output', dest='output', default=None,
+                  metavar='FILE', help='write the results to FILE')
+parser.add_option('-b', '--baseline', dest='baseline', default=None,
+                  metavar='FILE',
+                  help='compare the results with earlier results in FILE and exit with status 1 if anything became slower or bigger')
+parser.add_option('-t', '--threshold', dest='threshold', type='float',
+                  default=10, metavar='PERCENT',
+                  help='how much worse than the baseline a result must be to count as a regression (default is 10)')
+parser.add_option('-e', '--engine-option', dest='engineoptions',
+                  action='append', default=[], metavar='OPTION',
+                  help='pass an option on to dililatum, for example -e=-r')
+parser.add_option('-l', '--list', dest='list', action='store_true',
+                  default=False, help='list the scenarios and exit')
+
+def run_scenario(name, params, frames, engineoptions):
+    fd, out = tempfile.mkstemp(prefix='dililatum-benchmark-',
+                               suffix='.json')
+    os.close(fd)
+    try:
+        args = [sys.executable, dililatum, '-q', '-C', '-m',
+                '--headless', str(frames), '-z', str(params['zoom']),
+                '-d', probe, '-a', 'out=' + out,
+                '-a', 'chars=%d' % params['chars'],
+                '-a', 'objs=%d' % params['objs'],
+                '-a', 'text=%d' % params['text']] + engineoptions + \
+                [synthetic]
+        # The probe is imported as benchmarks.probe
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            [os.path.dirname(here)] +
+            [p for p in [env.get('PYTHONPATH')] if p])
+        devnull = open(os.devnull, 'w')
+        status = subprocess.call(args, stdout=devnull, env=env)
+        devnull.close()
+        if status != 0:
+            raise RuntimeError('scenario %s failed with status %d' %
+                               (name, status))
+        f = open(out)
+        results = json.load(f)
+        f.close()
+    finally:
+        os.remove(out)
+    results['params'] = params
+    return results
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, res in sorted(results.items()):
+        old = baseline.get(name)
+        if old is None:
+            continue
+        for metric, minimum in sorted(COMPARED.items()):
+            if metric not in old or not old[metric]:
+                continue
+            change = (res[metric] - old[metric]) * 100.0 / old[metric]
+            if change > threshold and res[metric] - old[metric] > minimum:
+                regressions.append((name, metric, old[metric],
+                                    res[metric], change))
+    return regressions
+
+def main():
+    (options, args) = parser.parse_args()
+    if options.list:
+        for name, params in SCENARIOS:
+            print name
+        return 0
+    scenarios = [(n, p) for n, p in SCENARIOS if not args or n in args]
+    unknown = set(args) - set(n for n, p in SCENARIOS)
+    if unknown:
+        parser.error('unknown scenarios: ' + ', '.join(sorted(unknown)))
+
+    results = {}
+    print '%-12s %9s %9s %9s %11s %10s' % ('scenario', 'p50 ms', 'p95 ms',
+                                           'p99 ms', 'allocs/fr', 'rss kB')
+    for name, params in scenarios:
+        res = run_scenario(name, params, options.frames,
+                           options.engineoptions)
+        results[name] = res
+        print '%-12s %9.3f %9.3f %9.3f %11.1f %10d' % (
+            name, res['p50'], res['p95'], res['p99'],
+            res['allocations_per_frame'], res['peak_rss'])
+        sys.stdout.flush()
+
+    if options.output is not None:
+        f = open(options.output, 'w')
+        json.dump({'frames': options.frames,
+                   'engineoptions': options.engineoptions,
+                   'scenarios': results}, f, indent=2, sort_keys=True)
+        f.close()
+
+    if options.baseline is not None:
+        f = open(options.baseline)
+        baseline = json.load(f)['scenarios']
+        f.close()
+        regressions = compare(results, baseline, options.threshold)
+        for name, metric, old, new, change in regressions:
+            print 'REGRESSION %s %s: %.3f -> %.3f (%+.1f%%)' % (
+                name, metric, old, new, change)
+        if regressions:
+            return 1
+        print 'No regressions of more than %g%%' % options.threshold
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
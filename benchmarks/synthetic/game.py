@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Dililatum: a quest system for simple RPGs
+# Copyright (C) 2010  Niels G. W. Serup
+
+# This file is part of Dililatum.
+#
+# Dililatum is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dililatum is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dililatum.  If not, see <http://www.gnu.org/licenses/>.
+
+##[ Name        ]## synthetic
+##[ Maintainer  ]## Niels G. W. Serup <ngws@metanohi.name>
+##[ Description ]## A game made up on the spot for benchmarking, with
+                  # as many characters, objects and words as asked for
+
+# Run it with -a NAME=VALUE arguments:
+#
+#   chars   number of walking characters (default 1)
+#   objs    number of overlay objects (default 10)
+#   text    number of characters of text in a message box (default 0)
+#   seed    seed of the random placement and walking (default 0)
+
+import os
+import random
+import shutil
+import tempfile
+import pygame
+from pygame.locals import *
+from dililatum.game import GenericGame
+from dililatum.bitmap import BitMap
+
+DIRECTIONS = ('lt', 'ct', 'rt', 'lm', 'rm', 'lb', 'cb', 'rb')
+WORDS = ('lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur',
+         'adipiscing', 'elit')
+
+class Game(GenericGame):
+    name = 'Synthetic benchmark'
+    shortname = 'synthetic'
+    size = (640, 480)
+    datadir = 'data/'
+
+    def get_argument(self, name, default):
+        for a in self.sys.etc.arguments:
+            if a.startswith(name + '='):
+                return type(default)(a[len(name) + 1:])
+        return default
+
+    def start_game(self):
+        self.chars = self.get_argument('chars', 1)
+        self.objs = self.get_argument('objs', 10)
+        self.text = self.get_argument('text', 0)
+        self.random = random.Random(self.get_argument('seed', 0))
+        self.tempdir = tempfile.mkdtemp(prefix='dililatum-synthetic-')
+
+        self.create_world()
+        self.world.start()
+        self.make_place()
+        self.make_characters()
+        if self.text > 0:
+            self.make_msgbox()
+        self.world.set_place(0, [self.size[0] / 2, self.size[1] * 3 / 4])
+        self.world.add_timer(self.world.walking_speed, self.wander,
+                             repeat=True)
+
+    def get_path(self, *names):
+        path = os.path.join(self.tempdir, *names)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        return path
+
+    def make_place(self):
+        w, h = self.size
+        bg = pygame.Surface(self.size)
+        for y in range(0, h, 8):
+            bg.fill((40 + y * 100 / h, 120, 60 + y * 150 / h),
+                    (0, y, w, 8))
+        pygame.image.save(bg, self.get_path('place.png'))
+        posoks = BitMap(w, h)
+        posoks.set_area(10, h / 4, w - 10, h - 5)
+        posoks.save(self.get_path('place.dililatumpos'))
+        place = self.world.create_place(self.get_path('place.png'),
+                                        self.get_path('place.dililatumpos'))
+
+        imgs = []
+        for i, size in enumerate(((24, 32), (48, 64), (64, 48), (96, 96))):
+            img = pygame.Surface(size, SRCALPHA)
+            img.fill((0, 0, 0, 0))
+            pygame.draw.ellipse(img, (30 + 50 * i, 90, 40, 220),
+                                img.get_rect())
+            imgs.append(self.get_path('objs', '%d.png' % i))
+            pygame.image.save(img, imgs[-1])
+        for i in range(self.objs):
+            obj = self.world.create_object(
+                pos=[self.random.randrange(w - 96),
+                     self.random.randrange(h - 96)],
+                imgfile=self.random.choice(imgs))
+            place.add_object(obj)
+        self.world.add_place(place)
+
+    def make_characters(self):
+        for d in DIRECTIONS:
+            for i in range(4):
+                img = pygame.Surface((40, 80), SRCALPHA)
+                img.fill((0, 0, 0, 0))
+                pygame.draw.ellipse(img, (200, 60 + 40 * i, 60, 255),
+                                    (0, 0, 40, 80))
+                pygame.draw.rect(img, (20, 20, 20, 160),
+                                 (15, 10 + 5 * i, 10, 10))
+                pygame.image.save(img, self.get_path('char', d, '%d.png' % i))
+        w, h = self.size
+        for i in range(self.chars):
+            char = self.load_character(
+                self.get_path('char'), visible=True,
+                position=[self.random.randrange(40, w - 40),
+                          self.random.randrange(h / 4 + 20, h - 10)])
+            if i == 0:
+                self.world.set_leading_character(char)
+            char.wander_direction = self.random.choice(DIRECTIONS)
+
+    def make_msgbox(self):
+        bg = pygame.Surface((620, 120), SRCALPHA)
+        bg.fill((250, 250, 230, 220))
+        pygame.image.save(bg, self.get_path('msgbox', 'bgimg.png'))
+        pointer = pygame.Surface((10, 10), SRCALPHA)
+        pointer.fill((0, 0, 0, 255))
+        pygame.image.save(pointer, self.get_path('msgbox', 'pointer.png'))
+        font = self.world.create_font(size=16)
+        msgbox = self.load_msgbox(path=self.get_path('msgbox'), font=font)
+        self.world.set_default_msgbox(msgbox)
+        words = []
+        while len(' '.join(words)) < self.text:
+            words.append(self.random.choice(WORDS))
+        self.message = ' '.join(words)[:self.text]
+
+    def wander(self):
+        for c in self.world.characters:
+            if self.random.random() < 0.1:
+                c.wander_direction = self.random.choice(DIRECTIONS)
+            before = c.position
+            c.walk(c.wander_direction)
+            if c.position is before:
+                c.wander_direction = self.random.choice(DIRECTIONS)
+
+    def run_game(self):
+        if self.text > 0:
+            self.world.show_message(self.message)
+        self.world.run()
+
+    def end(self):
+        GenericGame.end(self)
+        shutil.rmtree(self.tempdir, True)
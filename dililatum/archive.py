@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Dililatum: a quest system for simple RPGs
+# Copyright (C) 2010  Niels G. W. Serup
+
+# This file is part of Dililatum.
+#
+# Dililatum is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dililatum is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dililatum.  If not, see <http://www.gnu.org/licenses/>.
+
+##[ Name        ]## archive
+##[ Maintainer  ]## Niels G. W. Serup <ngws@metanohi.name>
+##[ Description ]## Contains the Archive class, which reads the files
+                  # of a game from one packed file
+
+# An archive starts with a header of MAGIC, the offset of the index
+# and the length of the index. The index is a marshalled dictionary
+# with a 'files' dictionary mapping paths to entries and a 'dirs'
+# dictionary mapping directories to their (subdirectories, files)
+# pairs. Paths are relative to the data directory of the game and
+# always use '/'. Entries are one of
+#
+#   ('image', offset, length, (width, height), format, colorkey)
+#   ('posmap', offset, length)
+#   ('raw', offset, length)
+#
+# Images are stored as decoded pixels in the given pygame.image
+# format, walkability maps in their usual packed form, and everything
+# else as it was. The colorkey of an image is None if it has none.
+# Data is aligned to ALIGN bytes.
+
+import os.path
+import io
+import mmap
+import marshal
+import struct
+import numpy
+import pygame
+from dililatum.bitmap import BitMap
+
+MAGIC = 'DLLTPAK1'
+HEADER = struct.Struct('<8sQQ')
+ALIGN = 16
+DEFAULT_NAME = 'data.dililatumpack'
+
+class Archive:
+    # The archive is memory-mapped, so reading a file from it is
+    # nothing more than looking up its entry. Surfaces and walkability
+    # maps use the mapped memory directly until they are converted.
+    # Paths are looked up relative to root, the data directory. If
+    # warn is given, it is called once for every file which is not in
+    # the archive but exists outside it.
+    def __init__(self, path, root=None, warn=None):
+        self.path = path
+        if root is None:
+            root = os.path.dirname(os.path.abspath(path))
+        self.root = os.path.abspath(root)
+        self.warn = warn
+        self.missed = set()
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.mtime = os.fstat(self.file.fileno()).st_mtime
+        magic, offset, length = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError('%s is not a Dililatum archive' % path)
+        index = marshal.loads(self.map[offset:offset + length])
+        self.files = index['files']
+        self.dirs = index['dirs']
+
+    def key(self, path):
+        rel = os.path.relpath(os.path.abspath(path), self.root)
+        if rel == os.curdir:
+            return '.'
+        return rel.replace(os.sep, '/')
+
+    def has(self, path):
+        key = self.key(path)
+        if key in self.files:
+            return True
+        self.miss(key, os.path.isfile, path)
+        return False
+
+    def has_dir(self, path):
+        key = self.key(path)
+        if key in self.dirs:
+            return True
+        self.miss(key, os.path.isdir, path)
+        return False
+
+    def miss(self, key, exists, path):
+        if self.warn is not None and key not in self.missed and \
+                exists(path):
+            self.missed.add(key)
+            self.warn('%s is not in the archive %s, using the file \
+instead' % (key, self.path))
+
+    def walk(self, path):
+        # The same as GenericGame.get_path_data does with os.walk
+        key = self.key(path)
+        if key not in self.dirs:
+            return None
+        paths = {}
+        for name, listing in self.dirs.items():
+            if name == key:
+                paths['.'] = listing
+            elif key == '.':
+                paths[name] = listing
+            elif name.startswith(key + '/'):
+                paths[name[len(key) + 1:]] = listing
+        return paths
+
+    def get_stat(self, path):
+        # The size and modification time of a file in the archive
+        return self.files[self.key(path)][2], self.mtime
+
+    def get_buffer(self, entry):
+        return buffer(self.map, entry[1], entry[2])
+
+    def read_image(self, path):
+        entry = self.files[self.key(path)]
+        if entry[0] != 'image':
+            return pygame.image.load(self.open_file(path), path)
+        surf = pygame.image.frombuffer(self.get_buffer(entry), entry[3],
+                                       entry[4])
+        if len(entry) > 5 and entry[5] is not None:
+            surf.set_colorkey(entry[5])
+        return surf
+
+    def read_posmap(self, path, size):
+        entry = self.files[self.key(path)]
+        bm = BitMap(*size)
+        n = bm.x * (bm.y // 8)
+        bm.use_packed(numpy.frombuffer(self.map, dtype=numpy.uint8,
+                                       count=min(n, entry[2]),
+                                       offset=entry[1]))
+        return bm
+
+    def read_data(self, path):
+        return str(self.get_buffer(self.files[self.key(path)]))
+
+    def open_file(self, path):
+        return io.BytesIO(self.get_buffer(self.files[self.key(path)]))
+
+    def read_sound(self, path):
+        return pygame.mixer.Sound(file=self.open_file(path))
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+def open_archive(path=None, warn=None):
+    # The given archive, or the default archive in the current
+    # directory if there is one. The current directory is the data
+    # directory of the game, wherever the archive is.
+    if path is None:
+        if not os.path.isfile(DEFAULT_NAME):
+            return None
+        path = DEFAULT_NAME
+    return Archive(path, os.getcwd(), warn)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Dililatum: a quest system for simple RPGs
+# Copyright (C) 2010  Niels G. W. Serup
+
+# This file is part of Dililatum.
+#
+# Dililatum is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dililatum is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dililatum.  If not, see <http://www.gnu.org/licenses/>.
+
+##[ Name        ]## atlas
+##[ Maintainer  ]## Niels G. W. Serup <ngws@metanohi.name>
+##[ Description ]## Contains the Atlas class, which packs many small
+                  # images into a few large surfaces
+
+import os
+import math
+import marshal
+import hashlib
+import pygame
+from pygame.locals import *
+
+MAX_SIZE = 2048
+
+def shelf_pack(sizes, maxsize=MAX_SIZE):
+    # Places rectangles of the given sizes in rows ("shelves"), the
+    # tallest first, starting a new page when a page is full. Returns
+    # a (page, x, y) position for every size and the size of every
+    # page.
+    area = sum(w * h for w, h in sizes)
+    widest = max([1] + [w for w, h in sizes])
+    width = max(widest, min(maxsize, int(math.ceil(math.sqrt(area)))))
+    order = sorted(range(len(sizes)), key=lambda i: -sizes[i][1])
+    positions = [None] * len(sizes)
+    pages = []
+    page = x = y = shelf = used = 0
+    for i in order:
+        w, h = sizes[i]
+        if x + w > width:
+            y += shelf
+            x = shelf = 0
+        if y + h > maxsize and y > 0:
+            pages.append((used, y + shelf))
+            page += 1
+            x = y = shelf = used = 0
+        positions[i] = (page, x, y)
+        x += w
+        used = max(used, x)
+        shelf = max(shelf, h)
+    pages.append((used, y + shelf))
+    return positions, pages
+
+class Atlas:
+    # A few surfaces holding many images, and the rectangle of every
+    # image. Images are copied exactly, including their alpha values.
+    def __init__(self, surfs, maxsize=MAX_SIZE):
+        sizes = [s.get_size() for s in surfs]
+        positions, pagesizes = shelf_pack(sizes, maxsize)
+        self.pages = [pygame.Surface([max(1, x) for x in size],
+                                     SRCALPHA).convert_alpha()
+                      for size in pagesizes]
+        for page in self.pages:
+            page.fill((0, 0, 0, 0))
+        self.rects = []
+        for surf, (page, x, y) in zip(surfs, positions):
+            self.pages[page].blit(surf, (x, y), special_flags=BLEND_RGBA_MAX)
+            self.rects.append((page, pygame.Rect((x, y), surf.get_size())))
+
+    def get(self, i):
+        page, rect = self.rects[i]
+        return self.pages[page].subsurface(rect)
+
+    def get_bytes(self):
+        return sum(p.get_pitch() * p.get_height() for p in self.pages)
+
+def get_frames(chars):
+    frames = []
+    seen = set()
+    for c in chars:
+        for direction in c.frames.values():
+            for f in direction or []:
+                if id(f) not in seen:
+                    seen.add(id(f))
+                    frames.append(f)
+    return frames
+
+def pack_frames(frames, maxsize=MAX_SIZE):
+    # Moves the images of the given frames into an atlas. Frames with
+    # the same image share the same part of the atlas. Returns the
+    # atlas and the image number of every frame path.
+    surfs = []
+    index = {}
+    for f in frames:
+        key = f.path or id(f.surf)
+        if key not in index:
+            index[key] = len(surfs)
+            surfs.append(f.surf)
+    atlas = Atlas(surfs, maxsize)
+    for f in frames:
+        f.surf = atlas.get(index[f.path or id(f.surf)])
+    return atlas, dict((k, i) for k, i in index.items()
+                       if isinstance(k, basestring))
+
+class AtlasCache:
+    # Atlases stored on disk as PNG pages and a marshalled table of
+    # rectangles, named after the paths, sizes and modification times
+    # of the images they hold. Images in the archive use the size of
+    # their entry and the modification time of the archive.
+    def __init__(self, directory, archive=None):
+        self.directory = directory
+        self.archive = archive
+
+    def get_name(self, paths):
+        h = hashlib.md5()
+        for p in sorted(set(os.path.abspath(p) for p in paths)):
+            if self.archive is not None and self.archive.has(p):
+                size, mtime = self.archive.get_stat(p)
+            else:
+                st = os.stat(p)
+                size, mtime = st.st_size, st.st_mtime
+            h.update('%s\0%d\0%d\0' % (p, size, int(mtime)))
+        return os.path.join(self.directory, h.hexdigest())
+
+    def has(self, paths):
+        try:
+            return os.path.isfile(self.get_name(paths) + '.index')
+        except Exception:
+            return False
+
+    def load(self, paths):
+        # A {path: surface} dictionary, or None
+        try:
+            name = self.get_name(paths)
+            f = open(name + '.index', 'rb')
+            table = marshal.load(f)
+            f.close()
+            pages = [pygame.image.load('%s-%d.png' % (name, i)).convert_alpha()
+                     for i in range(table['pages'])]
+        except Exception:
+            return None
+        return dict((p, pages[page].subsurface(rect))
+                    for p, (page, rect) in table['rects'].items())
+
+    def save(self, paths, atlas, index):
+        # index maps paths to image numbers of the atlas
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            name = self.get_name(paths)
+            for i, page in enumerate(atlas.pages):
+                pygame.image.save(page, '%s-%d.png' % (name, i))
+            rects = dict((p, (atlas.rects[i][0], tuple(atlas.rects[i][1])))
+                         for p, i in index.items())
+            f = open(name + '.index', 'wb')
+            marshal.dump({'pages': len(atlas.pages), 'rects': rects}, f)
+            f.close()
+        except Exception:
+            pass
@@ -27,43 +27,114 @@
 import numpy
 
 class BitMap:
+    # Bits are kept unpacked in a boolean array indexed by [x, y]. On
+    # disk, every column of y bits is packed into bytes, the lowest
+    # bit of each byte being the topmost position.
     def __init__(self, x, y):
         self.x = x
         self.y = y
-        self.arr = numpy.zeros((x, y/8), dtype=numpy.int8)
+        self.bits = numpy.zeros((x, y), dtype=bool)
+        self.version = 0
+        self.integral = None
+        self.integral_version = None
 
     def load(self, filename):
-        f = open(filename, 'rb')
-        c = f.read()
-        p = 0
-        for j in range(self.x):
-            for i in range(self.y/8):
-                self.arr[j][i] = ord(c[p])
-                p += 1
-        f.close()
+        n = self.y // 8
+        packed = numpy.fromfile(filename, dtype=numpy.uint8,
+                                count=self.x * n).reshape(self.x, n)
+        self.use_packed(packed)
+
+    def use_packed(self, packed):
+        n = self.y // 8
+        bits = numpy.unpackbits(packed.reshape(self.x, n, 1), axis=2)
+        self.bits[:, :n * 8] = bits[:, :, ::-1].reshape(self.x, n * 8)
+        self.version += 1
+
+    def get_packed(self):
+        n = self.y // 8
+        bits = self.bits[:, :n * 8].reshape(self.x, n, 8)[:, :, ::-1]
+        return numpy.packbits(bits, axis=2).reshape(self.x, n)
+
+    arr = property(get_packed)
+
+    def save(self, filename):
+        self.get_packed().tofile(filename)
 
     def set(self, x, y, do=True):
-        try:
-            p = self.arr[x][y/8]
-        except IndexError:
-            return
-        tmp = 1;
-        for i in range(y % 8):
-            tmp *= 2
-        if do and not self.get(x, y):
-            self.arr[x][y/8] += tmp
-        elif not do and self.get(x, y):
-            self.arr[x][y/8] -= tmp
+        x = int(x)
+        y = int(y)
+        if 0 <= x < self.x and 0 <= y < self.y:
+            self.bits[x, y] = do
+            self.version += 1
 
     def unset(self, x, y):
         self.set(x, y, False)
 
     def get(self, x, y):
-        try:
-            p = self.arr[x][y/8]
-        except IndexError:
-            return
-        tmp = 1;
-        for i in range(int(y % 8)):
-            tmp *= 2
-        return (p / tmp) % 2 == 1
+        x = int(x)
+        y = int(y)
+        if 0 <= x < self.x and 0 <= y < self.y:
+            return bool(self.bits[x, y])
+
+    def inside(self, xs, ys):
+        return (xs >= 0) & (xs < self.x) & (ys >= 0) & (ys < self.y)
+
+    def get_many(self, xs, ys):
+        # Positions outside the map are never set.
+        xs = numpy.asarray(xs, dtype=int)
+        ys = numpy.asarray(ys, dtype=int)
+        ok = self.inside(xs, ys)
+        result = numpy.zeros(ok.shape, dtype=bool)
+        result[ok] = self.bits[xs[ok], ys[ok]]
+        return result
+
+    def set_many(self, xs, ys, do=True):
+        xs = numpy.asarray(xs, dtype=int)
+        ys = numpy.asarray(ys, dtype=int)
+        ok = self.inside(xs, ys)
+        self.bits[xs[ok], ys[ok]] = do
+        self.version += 1
+
+    def clip_area(self, x1, y1, x2, y2):
+        return (min(max(int(x1), 0), self.x), min(max(int(y1), 0), self.y),
+                min(max(int(x2), 0), self.x), min(max(int(y2), 0), self.y))
+
+    def get_area(self, x1, y1, x2, y2):
+        x1, y1, x2, y2 = self.clip_area(x1, y1, x2, y2)
+        return self.bits[x1:x2, y1:y2]
+
+    def set_area(self, x1, y1, x2, y2, do=True):
+        x1, y1, x2, y2 = self.clip_area(x1, y1, x2, y2)
+        self.bits[x1:x2, y1:y2] = do
+        self.version += 1
+
+    def get_integral(self):
+        # A summed-area table: integral[x, y] is the number of set bits
+        # above and to the left of (x, y). It is made again when the
+        # bits have changed.
+        if self.integral_version != self.version:
+            integral = numpy.zeros((self.x + 1, self.y + 1),
+                                   dtype=numpy.int32)
+            self.bits.cumsum(0, dtype=numpy.int32).cumsum(
+                1, out=integral[1:, 1:])
+            self.integral = integral
+            self.integral_version = self.version
+        return self.integral
+
+    def count_area(self, x1, y1, x2, y2):
+        x1, y1, x2, y2 = self.clip_area(x1, y1, x2, y2)
+        if x2 <= x1 or y2 <= y1:
+            return 0
+        s = self.get_integral()
+        return int(s[x2, y2] - s[x1, y2] - s[x2, y1] + s[x1, y1])
+
+    def area_fraction(self, x1, y1, x2, y2):
+        # Positions outside the map count as unset.
+        total = (int(x2) - int(x1)) * (int(y2) - int(y1))
+        if total <= 0:
+            return 0.0
+        return self.count_area(x1, y1, x2, y2) / float(total)
+
+    def area_set(self, x1, y1, x2, y2):
+        total = (int(x2) - int(x1)) * (int(y2) - int(y1))
+        return total > 0 and self.count_area(x1, y1, x2, y2) == total
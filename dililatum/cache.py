@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Dililatum: a quest system for simple RPGs
+# Copyright (C) 2010  Niels G. W. Serup
+
+# This file is part of Dililatum.
+#
+# Dililatum is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dililatum is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dililatum.  If not, see <http://www.gnu.org/licenses/>.
+
+##[ Name        ]## cache
+##[ Maintainer  ]## Niels G. W. Serup <ngws@metanohi.name>
+##[ Description ]## Contains caches keeping surfaces around so that
+                  # they do not have to be loaded or scaled again
+
+import weakref
+from collections import OrderedDict
+import pygame
+
+def surface_bytes(surf):
+    return surf.get_pitch() * surf.get_height()
+
+class ScaleCache:
+    # Zoomed copies of surfaces, keyed by the identity of the source
+    # surface. An entry disappears when its source surface is
+    # released, and the whole cache is emptied when the zoom
+    # changes. Surfaces that are changed in place after having been
+    # scaled must be discarded manually.
+    def __init__(self, maxbytes):
+        self.maxbytes = maxbytes
+        self.zoom = None
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, surf, zoom):
+        if zoom != self.zoom:
+            self.clear()
+            self.zoom = zoom
+        key = id(surf)
+        entry = self.entries.pop(key, None)
+        if entry is not None and entry[0]() is surf:
+            self.entries[key] = entry
+            self.hits += 1
+            return entry[1]
+        elif entry is not None:
+            self.size -= entry[2]
+
+        self.misses += 1
+        scaled = pygame.transform.smoothscale(
+            surf, [int(x * zoom) for x in surf.get_size()])
+        nbytes = surface_bytes(scaled)
+        if nbytes > self.maxbytes:
+            return scaled
+        try:
+            ref = weakref.ref(surf, lambda ref, key=key:
+                                  self.release(key, ref))
+        except TypeError:
+            return scaled
+        self.entries[key] = (ref, scaled, nbytes)
+        self.size += nbytes
+        while self.size > self.maxbytes:
+            self.size -= self.entries.popitem(last=False)[1][2]
+            self.evictions += 1
+        return scaled
+
+    def release(self, key, ref):
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] is ref:
+            del self.entries[key]
+            self.size -= entry[2]
+
+    def discard(self, surf):
+        entry = self.entries.pop(id(surf), None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses,
+                    evictions=self.evictions, entries=len(self.entries),
+                    bytes=self.size)
+
+class FrameCache:
+    # Scaled copies of character frames and shadows. Sources are keyed
+    # by something shared between characters (the path of a frame
+    # image), and scales are quantized to steps of the given size so
+    # that only a few sizes of each frame are ever made.
+    def __init__(self, step):
+        self.step = step
+        self.surfaces = {}
+        self.hits = 0
+        self.misses = 0
+
+    def quantize(self, scale):
+        if not self.step:
+            return scale
+        return max(1, int(round(scale / self.step))) * self.step
+
+    def get(self, key, surf, size):
+        size = tuple(size)
+        try:
+            scaled = self.surfaces[(key, size)]
+            self.hits += 1
+            return scaled
+        except KeyError:
+            pass
+        self.misses += 1
+        if size == surf.get_size():
+            scaled = surf
+        else:
+            scaled = pygame.transform.smoothscale(surf, size)
+        self.surfaces[(key, size)] = scaled
+        return scaled
+
+    def clear(self):
+        self.surfaces.clear()
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses,
+                    entries=len(self.surfaces),
+                    bytes=sum(surface_bytes(s)
+                              for s in self.surfaces.values()))
+
+class AssetCache:
+    # Loaded and converted images, keyed by (absolute path, alpha,
+    # modification time) so that changed files are loaded again. When
+    # the images take up more than maxbytes, the least recently used
+    # are forgotten, except for those whose paths are pinned.
+    def __init__(self, maxbytes):
+        self.maxbytes = maxbytes
+        self.entries = OrderedDict()
+        # The current key of each (path, alpha) variant, whose older
+        # modification times are forgotten
+        self.keys = {}
+        self.pinned = set()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries[key] = entry
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, surf):
+        old = self.keys.get(key[:-1])
+        if old is not None and old != key:
+            self.remove(old)
+        self.remove(key)
+        nbytes = surface_bytes(surf)
+        self.entries[key] = (surf, nbytes)
+        self.keys[key[:-1]] = key
+        self.size += nbytes
+        self.shrink()
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+            if self.keys.get(key[:-1]) == key:
+                del self.keys[key[:-1]]
+
+    def shrink(self):
+        if self.size <= self.maxbytes:
+            return
+        for key in self.entries.keys():
+            if key[0] in self.pinned:
+                continue
+            self.remove(key)
+            self.evictions += 1
+            if self.size <= self.maxbytes:
+                break
+
+    def pin(self, paths):
+        # Only the given paths are pinned from now on
+        self.pinned = set(paths)
+        self.shrink()
+
+    def clear(self):
+        self.entries.clear()
+        self.keys.clear()
+        self.size = 0
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses,
+                    evictions=self.evictions, entries=len(self.entries),
+                    pinned=len(self.pinned), bytes=self.size)
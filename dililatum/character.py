@@ -28,10 +28,13 @@ from datetime import datetime
 import os.path
 import pygame
 from pygame.locals import *
+from dililatum.pathfind import direction_to
+from dililatum.atlas import get_frames, pack_frames
 
 class Frame:
-    def __init__(self, img):
+    def __init__(self, img, path=None):
         self.surf = img
+        self.path = path
         self.width = img.get_width()
         self.height = img.get_height()
 
@@ -77,7 +80,12 @@ class Character:
         self.original_position = get('position', self.default_position[:])
         self.position = self.position[:]
         self.modified_position = self.position[:]
+        self.previous_position = self.modified_position
+        self.step_time = 0
         self.visible = get('visible', False)
+        self.path = None
+        self.path_timer = None
+        self.field = None
 
         self.create()
         if self.use_shadow:
@@ -90,16 +98,34 @@ class Character:
         frames = []
         for f in files:
             img = self.world.load_image(f, True)
-            frames.append(Frame(img))
+            frames.append(Frame(img, os.path.abspath(f)))
         return frames
 
     def create(self):
+        files = {}
         for x in 'lt', 'ct', 'rt', 'lm', 'rm', 'lb', 'cb', 'rb':
             if x in self.data[1]: # Files and directories
-                files = self.data[1][x][1] # 1 = files
-                files = [os.path.join(self.data[0], x, t) for t in files]
-                self.frames[x] = \
-                    self.convert_files_to_surfaces(*files)
+                files[x] = [os.path.join(self.data[0], x, t)
+                            for t in self.data[1][x][1]] # 1 = files
+
+        # With an atlas per character, the atlas may already be on disk
+        use_atlas = self.world.sys.etc.atlas == 'character'
+        cache = self.world.atlas_cache
+        paths = sorted(set(os.path.abspath(f) for fs in files.values()
+                           for f in fs))
+        cached = None
+        if use_atlas and cache is not None:
+            cached = cache.load(paths)
+        for x, fs in files.items():
+            if cached is not None:
+                self.frames[x] = [Frame(cached[os.path.abspath(f)],
+                                        os.path.abspath(f)) for f in fs]
+            else:
+                self.frames[x] = self.convert_files_to_surfaces(*fs)
+        if use_atlas and cached is None:
+            atlas, index = pack_frames(get_frames([self]))
+            if cache is not None:
+                cache.save(paths, atlas, index)
 
         if len(self.frames) < 8:
             self.fill_out_remaining_directions()
@@ -206,35 +232,140 @@ class Character:
             npos = [int(pos[i] + mov[i] * resize * scale *
                         self.world.size[i] / 100.0) for i in range(2)]
             mpos = self.world.current_place.char_pos(npos)
-            pos_ok = True # self.world.current_place.pos_ok(mpos, maxsize)
+            pos_ok = not self.world.sys.etc.walkcheck or \
+                self.world.current_place.pos_ok(mpos, maxsize)
 
             scale -= .1
             if scale < 0.4:
                 break
         if pos_ok:
-            conti = True
-            for o in self.world.current_place.objects:
-                t = o.check_if_action_needed(npos, maxsize)
-                if not t: conti = False
+            conti = self.world.current_place.check_objects(npos, maxsize)
             if conti:
                 self.direction = direction
                 self.position = npos
+                self.previous_position = self.modified_position
                 self.modified_position = mpos
+                self.step_time = self.world.time
                 self.walking = True
         else:
             self.stop()
 
+    def get_step_length(self, pos):
+        resize = self.world.current_place.char_size(pos)
+        return [max(abs(m[i]) for m in self.movement.values()) *
+                resize * self.world.size[i] / 100.0 for i in range(2)]
+
+    def get_walk_size(self):
+        place = self.world.current_place
+        return [s * place.char_size(self.modified_position)
+                for s in self.maxsize]
+
+    def walk_to(self, pos, endaction=None):
+        # Walk to pos along a path around whatever is not walkable.
+        # Returns False if there is no such path.
+        self.stop_path()
+        path = self.world.pathfinder.find_path(
+            self.world.current_place, self.modified_position, pos,
+            self.get_walk_size())
+        if path is None:
+            return False
+        self.path = path
+        self.path_endaction = endaction
+        self.path_blocked = 0
+        self.path_timer = self.world.add_timer(
+            self.world.walking_speed, self.follow_path, repeat=True)
+        return True
+
+    def follow_path(self):
+        pos = self.modified_position
+        step = self.get_step_length(pos)
+        while self.path and \
+                abs(self.path[0][1][0] - pos[0]) <= step[0] and \
+                abs(self.path[0][1][1] - pos[1]) <= step[1]:
+            del self.path[0]
+        if not self.path:
+            self.arrive()
+            return
+
+        direction = direction_to(pos, self.path[0][1],
+                                 [s / 2 for s in step])
+        if direction is None:
+            direction = self.path[0][0]
+        self.take_path_step(direction)
+
+    def walk_with(self, goal, endaction=None):
+        # Walk to goal by following the flow field shared by all
+        # characters of the same size going there, which is much
+        # cheaper than walk_to when many characters go to the same
+        # place. Returns False if goal cannot be reached.
+        self.stop_path()
+        field = self.world.pathfinder.get_flow_field(
+            self.world.current_place, goal, self.get_walk_size())
+        if field is None:
+            if self.world.current_place.get_posoks() is None:
+                return self.walk_to(goal, endaction)
+            return False
+        if not field.reachable(self.modified_position):
+            return False
+        self.field = field
+        self.path_endaction = endaction
+        self.path_blocked = 0
+        self.path_timer = self.world.add_timer(
+            self.world.walking_speed, self.follow_field, repeat=True)
+        return True
+
+    def follow_field(self):
+        pos = self.modified_position
+        step = self.get_step_length(pos)
+        goal = self.field.get_goal()
+        direction = None
+        if abs(goal[0] - pos[0]) > step[0] or \
+                abs(goal[1] - pos[1]) > step[1]:
+            direction = self.field.get_direction(pos)
+            if direction is None:
+                direction = direction_to(pos, goal, [s / 2 for s in step])
+        if direction is None:
+            self.arrive()
+        else:
+            self.take_path_step(direction)
+
+    def take_path_step(self, direction):
+        before = self.position
+        self.walk(direction)
+        if self.position is before:
+            self.path_blocked += 1
+            if self.path_blocked > 3:
+                self.stop_path()
+                self.stop()
+        else:
+            self.path_blocked = 0
+
+    def arrive(self):
+        endaction = self.path_endaction
+        self.stop_path()
+        self.stop()
+        if endaction is not None:
+            endaction[0](*endaction[1:])
+
+    def stop_path(self):
+        if self.path_timer is not None:
+            self.world.cancel_timer(self.path_timer)
+        self.path_timer = None
+        self.path = None
+        self.field = None
+
     def set_position(self, pos):
         self.position = pos
         self.modified_position = self.world.current_place.char_pos(pos)
+        self.previous_position = self.modified_position
 
     def reset_position(self):
         self.position = self.original_position[:]
         self.modified_position = self.original_position[:]
+        self.previous_position = self.modified_position
         self.direction = self.original_direction
         w, h, resize = self.get_size(self.modified_position)
-        for o in self.world.current_place.objects:
-            o.check_if_action_needed(self.position, (w, h))
+        self.world.current_place.check_objects(self.position, (w, h))
 
     def say(self, msg, **oargs):
         if self.name is not None:
@@ -256,19 +387,58 @@ class Character:
     def show(self):
         self.visible = True
 
-    def draw(self, surf=None):
-        if not self.visible: return False
+    def get_draw_position(self):
+        # Until the next step is due, characters are drawn somewhere
+        # between their previous and their current position.
+        prev = self.previous_position
+        cur = self.modified_position
+        if prev is cur:
+            return cur
+        a = (self.world.get_draw_time() - self.step_time) / \
+            float(self.world.get_walking_duration())
+        if a >= 1:
+            return cur
+        return [int(prev[i] + (cur[i] - prev[i]) * a) for i in range(2)]
+
+    def get_draw_geometry(self):
+        # The scale is quantized so that scaled frames can be reused
+        # from the frame cache of the world.
         img = self.get_frame()
-        pos = self.modified_position
+        pos = self.get_draw_position()
+        r = self.world.frame_cache.quantize(
+            self.world.current_place.char_size(pos))
+        w = int(img.width * r)
+        h = int(img.height * r)
+        return img, pos, w, h, r
+
+    def get_rect(self):
+        img, pos, w, h, r = self.get_draw_geometry()
+        rect = pygame.Rect(pos[0] - w / 2, pos[1] - h, w, h)
+        if self.use_shadow:
+            ssize = [int(s * r) for s in self.shadow_size]
+            rect.union_ip(pygame.Rect(
+                    (pos[0] - w / 2 + (w - ssize[0]) / 2, pos[1] - h / 15),
+                    ssize))
+        return rect
+
+    def get_draw_state(self):
+        # The depth is part of the state, as a step can change the
+        # drawing order before the drawn position has moved
+        if not self.visible: return None
+        return self.get_rect(), self.get_frame().surf, \
+            self.get_bottom_area()[1]
 
-        w, h, r = self.get_size(pos, img)
-        img = pygame.transform.smoothscale(img.surf, (w, h))
+    def draw(self, surf=None):
+        if not self.visible: return False
+        img, pos, w, h, r = self.get_draw_geometry()
+        cache = self.world.frame_cache
+        img = cache.get(img.path or img, img.surf, (w, h))
         if surf is None:
             surf = self.world
         if self.use_shadow:
             ssize = [int(s * r) for s in self.shadow_size]
-            shad = pygame.transform.smoothscale(
-                self.shadow, ssize)
+            shad = cache.get(('shadow', self.shadow_size), self.shadow,
+                             ssize)
             shad_pos = (pos[0] - w / 2 + (w - ssize[0]) / 2, pos[1] - h / 15)
             surf.blit(shad, shad_pos)
         surf.blit(img, (pos[0] - w / 2, pos[1] - h))
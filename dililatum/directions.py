@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Dililatum: a quest system for simple RPGs
+# Copyright (C) 2010  Niels G. W. Serup
+
+# This file is part of Dililatum.
+#
+# Dililatum is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dililatum is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dililatum.  If not, see <http://www.gnu.org/licenses/>.
+
+##[ Name        ]## directions
+##[ Maintainer  ]## Niels G. W. Serup <ngws@metanohi.name>
+##[ Description ]## Contains the names characters walk with for every
+                  # step between neighbouring cells
+
+import math
+
+# Cell steps and the directions of characters walking them
+DIRECTIONS = {
+    (-1, -1): 'lt', (0, -1): 'ct', (1, -1): 'rt',
+    (-1, 0): 'lm', (1, 0): 'rm',
+    (-1, 1): 'lb', (0, 1): 'cb', (1, 1): 'rb'
+}
+# The length of a diagonal step
+SQRT2 = math.sqrt(2)
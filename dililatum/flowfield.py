@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Dililatum: a quest system for simple RPGs
+# Copyright (C) 2010  Niels G. W. Serup
+
+# This file is part of Dililatum.
+#
+# Dililatum is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dililatum is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dililatum.  If not, see <http://www.gnu.org/licenses/>.
+
+##[ Name        ]## flowfield
+##[ Maintainer  ]## Niels G. W. Serup <ngws@metanohi.name>
+##[ Description ]## Contains the FlowField class, which tells any
+                  # number of characters which way to walk to reach
+                  # the same goal
+
+import numpy
+from dililatum.directions import DIRECTIONS, SQRT2
+
+STEPS = DIRECTIONS.keys()
+COSTS = numpy.array([SQRT2 if dx and dy else 1.0 for dx, dy in STEPS])
+
+def shifted(arr, dx, dy, fill):
+    # result[x, y] is arr[x + dx, y + dy], or fill outside arr
+    w, h = arr.shape
+    result = numpy.empty_like(arr)
+    result[...] = fill
+    result[max(-dx, 0):w - max(dx, 0), max(-dy, 0):h - max(dy, 0)] = \
+        arr[max(dx, 0):w - max(-dx, 0), max(dy, 0):h - max(-dy, 0)]
+    return result
+
+class FlowField:
+    # The walking distance from every cell of a walk grid to a goal
+    # cell, diagonal steps being SQRT2 long, and from that the
+    # direction to walk in every cell. The distances are found by
+    # relaxing whole arrays at a time until none of them get shorter,
+    # which takes about as many rounds as the longest path has steps.
+    def __init__(self, grid, goal):
+        self.grid = grid
+        self.goal = goal
+        walkable = grid.walkable
+
+        allowed = {}
+        for dx, dy in STEPS:
+            ok = walkable & shifted(walkable, dx, dy, False)
+            if dx and dy:
+                ok &= shifted(walkable, dx, 0, False) & \
+                    shifted(walkable, 0, dy, False)
+            allowed[(dx, dy)] = ok
+
+        dist = numpy.empty(walkable.shape)
+        dist[...] = numpy.inf
+        if walkable[goal]:
+            dist[goal] = 0
+        while True:
+            options = self.get_options(dist, allowed)
+            shorter = options.min(axis=0)
+            # Summing the same steps in another order must not count
+            shorter[shorter > dist - 1e-9] = numpy.inf
+            if not numpy.isfinite(shorter).any():
+                break
+            dist = numpy.minimum(dist, shorter)
+        self.distances = dist
+
+        best = options.argmin(axis=0)
+        moving = numpy.isfinite(dist) & (dist > 0)
+        names = [DIRECTIONS[step] for step in STEPS]
+        self.directions = [[moving[x, y] and names[best[x, y]] or None
+                            for y in range(grid.height)]
+                           for x in range(grid.width)]
+
+    def get_options(self, dist, allowed):
+        # The distance through every neighbour of every cell
+        return numpy.array([numpy.where(allowed[step],
+                                        shifted(dist, step[0], step[1],
+                                                numpy.inf) + COSTS[i],
+                                        numpy.inf)
+                            for i, step in enumerate(STEPS)])
+
+    def get_direction(self, pos):
+        # The direction to walk from pos, or None when pos is at the
+        # goal or cannot reach it
+        cell = self.grid.nearest_walkable(self.grid.cell(pos))
+        if cell is None:
+            return None
+        return self.directions[cell[0]][cell[1]]
+
+    def reachable(self, pos):
+        cell = self.grid.nearest_walkable(self.grid.cell(pos))
+        return cell is not None and self.distances[cell] != numpy.inf
+
+    def get_goal(self):
+        return self.grid.center(self.goal)
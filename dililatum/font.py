@@ -41,7 +41,13 @@ class Font:
         self.create_font()
 
     def create_font(self):
-        self.font = pygame.font.Font(self.path, self.size)
+        archive = self.world.archive
+        if self.path is not None and archive is not None and \
+                archive.has(self.path):
+            self.font = pygame.font.Font(archive.open_file(self.path),
+                                         self.size)
+        else:
+            self.font = pygame.font.Font(self.path, self.size)
 
     def split_text(self, text, width):
         spl = text.split('\n')
@@ -60,7 +60,28 @@ class GenericGame:
     def create_world(self):
         self.world = World(self.sys, self.size)
 
+    def get_archive(self):
+        try:
+            return self.world.archive
+        except AttributeError:
+            return None
+
+    def file_exists(self, path):
+        archive = self.get_archive()
+        if archive is not None and archive.has(path):
+            return True
+        return os.path.isfile(path)
+
+    def read_data_file(self, path):
+        archive = self.get_archive()
+        if archive is not None and archive.has(path):
+            return archive.read_data(path).replace('\r\n', '\n')
+        return read_file(path)
+
     def get_path_data(self, path):
+        archive = self.get_archive()
+        if archive is not None and archive.has_dir(path):
+            return path, archive.walk(path)
         paths = {}
         for root, dirs, files in os.walk(path):
             name = root[len(path)+1:]
@@ -88,6 +109,9 @@ class GenericGame:
     def load_sounds(self, dirpath, add=True):
         snds = SearchDict()
         f = self.get_path_data(dirpath)[1]['.'][1]
+        if self.sys.etc.loadwait:
+            self.world.loader.preload(
+                'sound', [os.path.join(dirpath, x) for x in f])
         for x in f:
             snd = self.load_sound(os.path.join(dirpath, x), add)
             snds[x] = snd
@@ -140,9 +164,9 @@ class GenericGame:
             except Exception:
                 overlays[inum] = [inf]
 
+        backgroundpaths = []
         for i in range(num):
             prefi = pref % i
-            self.sys.emit_signal('beforeplaceload', self, i, prefi)
             okbg = False
             suffs = ['jpg', 'JPG', 'jpeg', 'JPEG', 'png', 'PNG', \
                 'gif', 'GIF', 'tga', 'TGA']
@@ -150,10 +174,32 @@ class GenericGame:
                 suff = suffs[0]
                 del suffs[0]
                 backgroundpath = os.path.join(imgpath, prefi + '.' + suff)
-                okbg = os.path.isfile(backgroundpath)
+                okbg = self.file_exists(backgroundpath)
                 if not okbg and len(suffs) == 0:
                     break
             if not okbg:
+                backgroundpath = None
+            backgroundpaths.append(backgroundpath)
+
+        if self.sys.etc.loadwait:
+            # Everything is decoded in the background while the places
+            # are being created in order
+            loader = self.world.loader
+            for i in range(num):
+                if backgroundpaths[i] is None:
+                    continue
+                prefi = pref % i
+                loader.preload('image', [backgroundpaths[i]])
+                loader.preload('posmap', [os.path.join(
+                            posokpath, prefi + '.dililatumpos')])
+                loader.preload('image', [os.path.join(objspath, c[0])
+                                         for c in overlays.get(prefi, [])])
+
+        for i in range(num):
+            prefi = pref % i
+            self.sys.emit_signal('beforeplaceload', self, i, prefi)
+            backgroundpath = backgroundpaths[i]
+            if backgroundpath is None:
                 self.sys.error('cannot find image for place ' + prefi)
                 continue
 
@@ -186,7 +232,7 @@ class GenericGame:
 
     def load_map_data(self, detailsfile):
         self.sys.emit_signal('beforemapload', self)
-        det = read_file(detailsfile)
+        det = self.read_data_file(detailsfile)
         dirs = {
             '^': 'up',
             '>': 'right',
@@ -279,8 +325,22 @@ class GenericGame:
                     )
 
     def load_character(self, path, add=True, **oargs):
-        char = self.world.create_character(
-            path, self.get_path_data(path), **oargs)
+        data = self.get_path_data(path)
+        files = []
+        frames = []
+        for name, (dirs, fs) in data[1].items():
+            if name == '.':
+                files.extend(os.path.join(path, x) for x in fs
+                             if x == 'head.png')
+            elif name in ('lt', 'ct', 'rt', 'lm', 'rm', 'lb', 'cb', 'rb'):
+                frames.extend(os.path.join(path, name, x) for x in fs)
+        # Frames in a cached atlas are not read at all
+        cache = self.world.atlas_cache
+        if self.sys.etc.atlas != 'character' or cache is None or \
+                not cache.has(frames):
+            files.extend(frames)
+        self.world.loader.preload('image', files)
+        char = self.world.create_character(path, data, **oargs)
         if add:
             self.world.add_character(char)
         return char
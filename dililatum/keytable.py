@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Dililatum: a quest system for simple RPGs
+# Copyright (C) 2010  Niels G. W. Serup
+
+# This file is part of Dililatum.
+#
+# Dililatum is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dililatum is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dililatum.  If not, see <http://www.gnu.org/licenses/>.
+
+##[ Name        ]## keytable
+##[ Maintainer  ]## Niels G. W. Serup <ngws@metanohi.name>
+##[ Description ]## Contains the KeyTable class, which finds the value
+                  # of the held key combination in a key dictionary
+
+class KeyTable:
+    # Looks up values in dictionaries of {value: [key, ...]}. The value
+    # whose keys are all held wins, and if there are more, the one
+    # with the most keys. If there are still more, the one whose keys
+    # were pressed first wins, i.e. the one with the lowest sum of the
+    # positions of its keys in the held keys, and then the first one
+    # in the dictionary.
+    #
+    # The candidates are found once for every combination of held
+    # keys used in the dictionary and kept in a table, so only ties
+    # have to look at the order of the held keys.
+    def __init__(self, keydict):
+        self.keydict = keydict
+        self.bindings = [(value, frozenset(keys))
+                         for value, keys in keydict.items()]
+        self.used = frozenset(k for value, keys in self.bindings
+                              for k in keys)
+        self.table = {}
+
+    def get_candidates(self, held):
+        try:
+            return self.table[held]
+        except KeyError:
+            pass
+        best = 0
+        found = []
+        for value, keys in self.bindings:
+            if keys <= held:
+                if len(keys) > best:
+                    best = len(keys)
+                    found = [(value, keys)]
+                elif len(keys) == best:
+                    found.append((value, keys))
+        found = tuple(found)
+        self.table[held] = found
+        return found
+
+    def get(self, keys_down):
+        # keys_down is a sequence of the held keys in the order they
+        # were pressed
+        used = self.used
+        held = frozenset(k for k in keys_down if k in used)
+        found = self.get_candidates(held)
+        if not found:
+            return None
+        if len(found) == 1:
+            return found[0][0]
+        positions = {}
+        i = 0
+        for k in keys_down:
+            if k not in positions:
+                positions[k] = i
+            i += 1
+        result = None
+        result_points = None
+        for value, keys in found:
+            points = sum(positions[k] for k in keys)
+            if result_points is None or points < result_points:
+                result = value
+                result_points = points
+        return result
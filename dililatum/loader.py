@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Dililatum: a quest system for simple RPGs
+# Copyright (C) 2010  Niels G. W. Serup
+
+# This file is part of Dililatum.
+#
+# Dililatum is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dililatum is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dililatum.  If not, see <http://www.gnu.org/licenses/>.
+
+##[ Name        ]## loader
+##[ Maintainer  ]## Niels G. W. Serup <ngws@metanohi.name>
+##[ Description ]## Contains the AssetLoader class, which reads and
+                  # decodes files on several threads at once
+
+import os.path
+import time
+from Queue import Queue
+import pygame
+from dililatum.bitmap import BitMap
+from dililatum.various import thread
+
+class AssetLoader:
+    # Files are read and decoded by worker threads as soon as they are
+    # preloaded. Whatever needs them later takes the results on the
+    # main thread, where images are converted to the format of the
+    # display. Taking something which is still being loaded waits for
+    # it. Every finished file emits the 'assetloadprogress' signal with
+    # the loader, the number of files done and preloaded so far, the
+    # number of bytes read and the estimated number of seconds left.
+    # Files in the archive of the world are never preloaded, as
+    # reading them costs next to nothing. Preloaded files which turn
+    # out not to be needed must be discarded, and everything left is
+    # thrown away by finish.
+    def __init__(self, world, threads=4):
+        self.world = world
+        self.threads = threads
+        self.requests = None
+        self.results = Queue()
+        self.pending = set()
+        self.unwanted = set()
+        self.ready = {}
+        self.done = 0
+        self.total = 0
+        self.bytes = 0
+        self.started = None
+        self.done_since_start = 0
+        self.readers = {
+            'image': self.read_image,
+            'posmap': self.read_posmap,
+            'sound': self.read_sound
+        }
+
+    def in_archive(self, path):
+        archive = self.world.archive
+        return archive is not None and archive.has(path)
+
+    def read_image(self, path):
+        if self.in_archive(path):
+            return self.world.archive.read_image(path)
+        return pygame.image.load(path)
+
+    def read_posmap(self, path):
+        if self.in_archive(path):
+            return self.world.archive.read_posmap(path, self.world.size)
+        bm = BitMap(*self.world.size)
+        bm.load(path)
+        return bm
+
+    def read_sound(self, path):
+        if self.in_archive(path):
+            return self.world.archive.read_sound(path)
+        return pygame.mixer.Sound(path)
+
+    def read(self, kind, path):
+        # Can be used on any thread
+        return self.readers[kind](path)
+
+    def load(self, kind, path):
+        # Must be used on the main thread
+        data = self.take(kind, path)
+        if data is None:
+            data = self.read(kind, path)
+        return data
+
+    def start_workers(self):
+        self.requests = Queue()
+        for i in range(self.threads):
+            thread(self.work)
+
+    def work(self):
+        while True:
+            key = self.requests.get()
+            if key is None:
+                break
+            try:
+                data = self.readers[key[0]](key[1])
+                nbytes = os.path.getsize(key[1])
+            except Exception:
+                data = None
+                nbytes = 0
+            self.results.put((key, data, nbytes))
+
+    def preload(self, kind, paths):
+        if self.threads <= 0:
+            return
+        if self.requests is None:
+            self.start_workers()
+        if not self.pending:
+            self.started = time.time()
+            self.done_since_start = 0
+        for p in paths:
+            key = (kind, os.path.abspath(p))
+            if key in self.pending or key in self.ready or \
+                    self.in_archive(p):
+                continue
+            self.pending.add(key)
+            self.total += 1
+            self.requests.put(key)
+
+    def collect(self, block=False):
+        if not self.pending:
+            return
+        if not block and self.results.empty():
+            return
+        key, data, nbytes = self.results.get()
+        self.pending.discard(key)
+        if key in self.unwanted:
+            self.unwanted.discard(key)
+        else:
+            self.ready[key] = data
+        self.done += 1
+        self.done_since_start += 1
+        self.bytes += nbytes
+        elapsed = time.time() - self.started
+        eta = elapsed / self.done_since_start * (self.total - self.done)
+        self.world.sys.emit_signal('assetloadprogress', self, self.done,
+                                   self.total, self.bytes, eta)
+
+    def take(self, kind, path):
+        # The decoded file, or None if it has not been preloaded or
+        # could not be loaded, in which case the caller should load it
+        # itself
+        key = (kind, os.path.abspath(path))
+        while key in self.pending:
+            self.collect(True)
+        return self.ready.pop(key, None)
+
+    def discard(self, kind, path):
+        # The file was found elsewhere, e.g. in a cache
+        if not self.pending and not self.ready:
+            return
+        key = (kind, os.path.abspath(path))
+        if key in self.pending:
+            self.unwanted.add(key)
+        else:
+            self.ready.pop(key, None)
+
+    def finish(self):
+        while self.pending:
+            self.collect(True)
+        self.unwanted.clear()
+        self.ready.clear()
+
+    def stop(self):
+        if self.requests is not None:
+            for i in range(self.threads):
+                self.requests.put(None)
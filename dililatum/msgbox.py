@@ -202,17 +202,16 @@ class MessageContainer:
         self.msgbox.msgcontainers.remove(self)
         self.visible = False
 
-    def draw(self):
-        if not self.visible: return
-
+    def get_blits(self):
+        blits = []
         if self.msgbox.bgimg is not None:
-            self.world.blit(self.msgbox.bgimg, self.pos)
+            blits.append((self.msgbox.bgimg, self.pos))
 
         if self.head is not None:
-            self.world.blit(self.head,
-                            [self.msgbox.headpos[i] +
-                             self.pos[i]
-                             for i in range(2)])
+            blits.append((self.head,
+                          [self.msgbox.headpos[i] +
+                           self.pos[i]
+                           for i in range(2)]))
 
         if self.text is not None:
             surf = self.textsurfs[self.surfnum]
@@ -220,13 +219,29 @@ class MessageContainer:
             text_y = self.pos[1] + self.msgbox.textpos[1] + \
                 (self.msgbox.size[1] - surf.get_size()[1]) / 2
             pos = (text_x, text_y)
-            self.world.blit(surf, pos)
+            blits.append((surf, pos))
 
             try:
-                if self.surfnum == self.surfnumstart:
-                    self.world.blit(
-                        self.pointer, (text_x, text_y +
-                                       self.pposs[self.ansnum][1]))
+                if self.surfnum == self.surfnumstart and \
+                        self.pointer is not None:
+                    blits.append((self.pointer,
+                                  (text_x, text_y +
+                                   self.pposs[self.ansnum][1])))
             except AttributeError:
                 pass
+        return blits
+
+    def get_draw_state(self):
+        if not self.visible: return None
+        blits = self.get_blits()
+        if not blits: return None
+        rect = pygame.Rect(blits[0][1], blits[0][0].get_size())
+        rect.unionall_ip([pygame.Rect(pos, surf.get_size())
+                          for surf, pos in blits[1:]])
+        return rect, [(surf, tuple(pos)) for surf, pos in blits]
 
+    def draw(self):
+        if not self.visible: return
+
+        for surf, pos in self.get_blits():
+            self.world.blit(surf, pos)
@@ -57,8 +57,7 @@ class Object:
         self.walkonact = get('walkonact', True)
         self.require_event = get('require', None)
         if self.require_event is not None:
-            self.world.link_event(self.require_event[0],
-                                  self.event_check)
+            self.world.link_trigger(self)
             self.close_to_touch = False
 
     def get_bottom_area(self):
@@ -151,6 +150,12 @@ class Object:
     def hide(self):
         self.visible = False
 
+    def get_draw_state(self):
+        if not self.visible: return None
+        if self.surf is None: self.load_image()
+        if self.surf is None: return None
+        return pygame.Rect(self.pos, self.surf.get_size()), self.surf
+
     def draw(self, surf=None):
         if not self.visible: return
         if self.surf is None: self.load_image()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Dililatum: a quest system for simple RPGs
+# Copyright (C) 2010  Niels G. W. Serup
+
+# This file is part of Dililatum.
+#
+# Dililatum is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dililatum is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dililatum.  If not, see <http://www.gnu.org/licenses/>.
+
+##[ Name        ]## pathfind
+##[ Maintainer  ]## Niels G. W. Serup <ngws@metanohi.name>
+##[ Description ]## Contains the PathFinder class, which finds ways
+                  # for characters to walk through places
+
+import heapq
+import numpy
+from dililatum.directions import DIRECTIONS, SQRT2
+from dililatum.flowfield import FlowField
+
+def sign(x):
+    return (x > 0) - (x < 0)
+
+def direction_to(start, goal, deadzone=(0, 0)):
+    d = tuple(sign(goal[i] - start[i])
+              if abs(goal[i] - start[i]) > deadzone[i] else 0
+              for i in range(2))
+    return DIRECTIONS.get(d)
+
+class WalkGrid:
+    # A coarse grid over the walkability map of a place. A cell is
+    # walkable when the feet area of a character standing in its
+    # center is completely walkable. Cells are also labelled with the
+    # connected area they belong to, so that impossible paths are
+    # known without searching.
+    def __init__(self, posoks, cellsize, feet):
+        self.posoks = posoks
+        self.version = posoks.version
+        self.cellsize = cellsize
+        self.width = posoks.x // cellsize
+        self.height = posoks.y // cellsize
+        self.paths = {}
+        self.fields = {}
+
+        cx = numpy.arange(self.width) * cellsize + cellsize / 2
+        cy = numpy.arange(self.height) * cellsize + cellsize / 2
+        x1 = numpy.clip(cx + feet[0], 0, posoks.x)[:, None]
+        x2 = numpy.clip(cx + feet[2], 0, posoks.x)[:, None]
+        y1 = numpy.clip(cy + feet[1], 0, posoks.y)[None, :]
+        y2 = numpy.clip(cy + feet[3], 0, posoks.y)[None, :]
+        s = posoks.get_integral()
+        count = s[x2, y2] - s[x1, y2] - s[x2, y1] + s[x1, y1]
+        total = (feet[2] - feet[0]) * (feet[3] - feet[1])
+        self.walkable = count == total
+        self.label_areas()
+
+    def label_areas(self):
+        w, h = self.width, self.height
+        walkable = self.walkable.tolist()
+        labels = [[0] * h for x in range(w)]
+        label = 0
+        for x in range(w):
+            for y in range(h):
+                if not walkable[x][y] or labels[x][y]:
+                    continue
+                label += 1
+                labels[x][y] = label
+                todo = [(x, y)]
+                while todo:
+                    a, b = todo.pop()
+                    for da, db in DIRECTIONS:
+                        na, nb = a + da, b + db
+                        if 0 <= na < w and 0 <= nb < h and \
+                                walkable[na][nb] and not labels[na][nb]:
+                            labels[na][nb] = label
+                            todo.append((na, nb))
+        self.walkable_list = walkable
+        self.labels = labels
+
+    def cell(self, pos):
+        return (min(max(int(pos[0]) // self.cellsize, 0), self.width - 1),
+                min(max(int(pos[1]) // self.cellsize, 0), self.height - 1))
+
+    def center(self, cell):
+        return [cell[i] * self.cellsize + self.cellsize / 2
+                for i in range(2)]
+
+    def nearest_walkable(self, cell, limit=8):
+        walkable = self.walkable_list
+        if walkable[cell[0]][cell[1]]:
+            return cell
+        for r in range(1, limit + 1):
+            best = None
+            for x in range(cell[0] - r, cell[0] + r + 1):
+                for y in range(cell[1] - r, cell[1] + r + 1):
+                    if 0 <= x < self.width and 0 <= y < self.height and \
+                            walkable[x][y]:
+                        d = abs(x - cell[0]) + abs(y - cell[1])
+                        if best is None or d < best[0]:
+                            best = (d, (x, y))
+            if best is not None:
+                return best[1]
+        return None
+
+    def neighbours(self, cell):
+        walkable = self.walkable_list
+        x, y = cell
+        for (dx, dy) in DIRECTIONS:
+            nx, ny = x + dx, y + dy
+            if not (0 <= nx < self.width and 0 <= ny < self.height) or \
+                    not walkable[nx][ny]:
+                continue
+            if dx and dy:
+                # Do not cut corners
+                if not walkable[x + dx][y] or not walkable[x][y + dy]:
+                    continue
+                yield (nx, ny), SQRT2
+            else:
+                yield (nx, ny), 1
+
+    def astar(self, start, goal):
+        def heuristic(cell):
+            dx = abs(cell[0] - goal[0])
+            dy = abs(cell[1] - goal[1])
+            return max(dx, dy) + (SQRT2 - 1) * min(dx, dy)
+
+        came_from = {start: None}
+        cost = {start: 0}
+        todo = [(heuristic(start), 0, start)]
+        while todo:
+            f, g, cell = heapq.heappop(todo)
+            if cell == goal:
+                break
+            if g > cost[cell]:
+                continue
+            for n, c in self.neighbours(cell):
+                ng = g + c
+                if n not in cost or ng < cost[n]:
+                    cost[n] = ng
+                    came_from[n] = cell
+                    heapq.heappush(todo, (ng + heuristic(n), ng, n))
+        else:
+            return None
+
+        cells = []
+        cell = goal
+        while cell is not None:
+            cells.append(cell)
+            cell = came_from[cell]
+        cells.reverse()
+        return cells
+
+    def find_path(self, start, goal):
+        start = self.nearest_walkable(self.cell(start))
+        goal = self.nearest_walkable(self.cell(goal))
+        if start is None or goal is None or \
+                self.labels[start[0]][start[1]] != \
+                self.labels[goal[0]][goal[1]]:
+            return None
+        try:
+            return self.paths[(start, goal)]
+        except KeyError:
+            pass
+
+        cells = self.astar(start, goal)
+        if cells is None:
+            return None
+        # Only keep the cells where the direction changes
+        path = []
+        for i in range(1, len(cells)):
+            step = (cells[i][0] - cells[i - 1][0],
+                    cells[i][1] - cells[i - 1][1])
+            direction = DIRECTIONS[step]
+            if path and path[-1][0] == direction:
+                path[-1] = (direction, self.center(cells[i]))
+            else:
+                path.append((direction, self.center(cells[i])))
+        if len(self.paths) > 1000:
+            self.paths.clear()
+        self.paths[(start, goal)] = path
+        return path
+
+class PathFinder:
+    # Finds paths through places as lists of (direction, waypoint)
+    # pairs, using the direction names characters walk with.
+    # Waypoints are in the coordinates of the walkability map.
+    def __init__(self, cellsize=8):
+        self.cellsize = cellsize
+        self.grids = {}
+
+    def get_grid(self, place, size):
+        posoks = place.get_posoks()
+        if posoks is None:
+            return None
+        feet = place.get_feet_area((0, 0), size)
+        feet = tuple(int(round(x)) for x in feet)
+        key = (place, feet)
+        grid = self.grids.get(key)
+        if grid is None or grid.posoks is not posoks or \
+                grid.version != posoks.version:
+            grid = WalkGrid(posoks, self.cellsize, feet)
+            self.grids[key] = grid
+        return grid
+
+    def find_path(self, place, start, goal, size):
+        grid = self.get_grid(place, size)
+        if grid is None:
+            # Everything is walkable
+            return [(direction_to(start, goal), list(goal))]
+        path = grid.find_path(start, goal)
+        if path is None:
+            return None
+        return path[:]
+
+    def get_flow_field(self, place, goal, size):
+        # A FlowField shared by every character of the given size
+        # walking to goal, or None if the place has no walkability map
+        grid = self.get_grid(place, size)
+        if grid is None:
+            return None
+        goal = grid.nearest_walkable(grid.cell(goal))
+        if goal is None:
+            return None
+        field = grid.fields.get(goal)
+        if field is None:
+            if len(grid.fields) > 64:
+                grid.fields.clear()
+            field = FlowField(grid, goal)
+            grid.fields[goal] = field
+        return field
+
+    def forget(self, place):
+        for key in self.grids.keys():
+            if key[0] is place:
+                del self.grids[key]
@@ -25,7 +25,8 @@
 
 import pygame
 from pygame.locals import *
-from dililatum.bitmap import BitMap
+from dililatum.spatial import SpatialGrid
+from dililatum.cache import surface_bytes
 
 class Place:
     def __init__(self, world, imgfile=None, posfile=None, **oargs):
@@ -41,38 +42,136 @@ class Place:
         self.obj_names = {}
         self.dir_objects = {}
         self.bgsounds = get('bgsnd', [])
+        self.object_index = None
+        self.touching = set()
+        self.surf = None
+        self.posoks = None
+        self.posfile_tried = False
 
         if self.world.sys.etc.loadwait:
             self.load_imgfile()
             self.load_posfile()
-        else:
-            self.surf = None
-            self.posoks = None
 
-    def load_imgfile(self):
+    # The read_* methods do not depend on the display, so they can be
+    # used outside of the main thread.
+    def read_imgfile(self):
         if self.imgfile is not None:
             try:
-                self.surf = pygame.image.load(self.imgfile).convert()
+                return self.world.loader.read('image', self.imgfile)
             except Exception:
                 pass
 
-    def load_posfile(self):
+    def read_posfile(self):
         if self.posfile is not None:
             try:
-                bm = BitMap(*self.world.size)
-                bm.load(self.posfile)
-                self.posoks = bm
+                return self.world.loader.read('posmap', self.posfile)
             except Exception:
                 pass
 
+    def load_imgfile(self):
+        surf = None
+        if self.imgfile is not None:
+            surf = self.world.loader.take('image', self.imgfile)
+        if surf is None:
+            surf = self.read_imgfile()
+        if surf is not None:
+            self.surf = surf.convert()
+
+    def load_posfile(self):
+        self.posfile_tried = True
+        posoks = None
+        if self.posfile is not None:
+            posoks = self.world.loader.take('posmap', self.posfile)
+        if posoks is None:
+            posoks = self.read_posfile()
+        self.posoks = posoks
+
+    def use_loaded(self, surf, posoks):
+        # Use data read elsewhere, unless it has been loaded already
+        if self.surf is None and surf is not None:
+            self.surf = surf.convert()
+        if not self.posfile_tried:
+            self.posfile_tried = True
+            self.posoks = posoks
+
+    def is_loaded(self):
+        return self.surf is not None and self.posfile_tried
+
+    def get_loaded_bytes(self):
+        n = 0
+        if self.surf is not None:
+            n += surface_bytes(self.surf)
+        if self.posoks is not None:
+            n += self.posoks.bits.nbytes
+        return n
+
+    def unload(self):
+        # Everything is loaded again when needed
+        self.surf = None
+        self.posoks = None
+        self.posfile_tried = False
+        self.world.pathfinder.forget(self)
+
+    def get_neighbours(self):
+        # The places that objects of this place lead to
+        places = []
+        for o in self.objects:
+            action = getattr(o, 'action', None)
+            if action and len(action) > 1 and \
+                    action[0] == self.world.set_place and \
+                    action[1] is not self and action[1] not in places:
+                places.append(action[1])
+        return places
+
     def add_object(self, obj):
         self.objects.append(obj)
+        self.object_index = None
+        self.world.invalidate_render_list()
 
     def set_direction_object(self, direction, obj):
         self.dir_objects[direction] = obj
 
     def remove_object(self, obj):
         self.objects.remove(obj)
+        self.object_index = None
+        self.touching.discard(obj)
+        self.world.invalidate_render_list()
+
+    def get_object_index(self):
+        if self.object_index is None:
+            index = SpatialGrid()
+            for o in self.objects:
+                if o.surf is None: o.load_image()
+                # Areas can also be (position, size) pairs, which
+                # feet_in_obj_check still matches inside the box of
+                # their corners
+                try:
+                    (x1, y1), (x2, y2) = o.area
+                    index.insert(o, min(x1, x2), min(y1, y2),
+                                 max(x1, x2), max(y1, y2))
+                except Exception:
+                    index.insert_always(o)
+            self.object_order = dict((o, i) for i, o in
+                                     enumerate(self.objects))
+            self.object_index = index
+        return self.object_index
+
+    def check_objects(self, pos, size):
+        # Only objects near the feet of the character, and objects the
+        # character was touching, can have anything to do.
+        index = self.get_object_index()
+        objs = index.query(pos[0] - size[0] / 2, pos[1] - size[1] / 20,
+                           pos[0] + size[0] / 2, pos[1])
+        objs.update(o for o in self.touching if o in self.object_order)
+        retval = True
+        for o in sorted(objs, key=self.object_order.get):
+            if not o.check_if_action_needed(pos, size):
+                retval = False
+            if o.in_area or getattr(o, 'close_to_touch', False):
+                self.touching.add(o)
+            else:
+                self.touching.discard(o)
+        return retval
 
     def char_size(self, pos):
         return 1.0
@@ -80,23 +179,29 @@ class Place:
     def char_pos(self, pos):
         return pos
 
-    def pos_ok(self, pos, size):
-        if self.posoks is None:
+    def get_posoks(self):
+        if self.posoks is None and not self.posfile_tried:
             self.load_posfile()
-        if self.posoks is None: # Still..
+        return self.posoks
+
+    def get_feet_area(self, pos, size):
+        # The area below a character of the given size which must be
+        # walkable, as (x1, y1, x2, y2) with x2 and y2 excluded
+        s0 = size[0] / 2
+        height = size[1] / 20
+        return (pos[0] - s0, pos[1] - height, pos[0] + s0 + 1, pos[1] + 1)
+
+    def pos_ok(self, pos, size):
+        posoks = self.get_posoks()
+        if posoks is None:
             return True
-        else:
-            height = self.char_size(pos) * \
-                self.world.leading_character.get_frame().height / 20
-            s0 = size[0] / 2
-            posmh = pos[1] - height
-            return self.posoks.get(*pos) and \
-                self.posoks.get(pos[0] - s0, pos[1]) and \
-                self.posoks.get(pos[0] + s0, pos[1]) and \
-                self.posoks.get(pos[0], posmh) and \
-                self.posoks.get(pos[0] - s0, posmh) and \
-                self.posoks.get(pos[0] + s0, posmh) and \
-                self.posoks.get(pos[0], (pos[1] + posmh) / 2)
+        return posoks.area_set(*self.get_feet_area(pos, size))
+
+    def pos_fraction(self, pos, size):
+        posoks = self.get_posoks()
+        if posoks is None:
+            return 1.0
+        return posoks.area_fraction(*self.get_feet_area(pos, size))
 
     def draw(self, surf=None):
         if surf is None:
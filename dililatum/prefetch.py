@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Dililatum: a quest system for simple RPGs
+# Copyright (C) 2010  Niels G. W. Serup
+
+# This file is part of Dililatum.
+#
+# Dililatum is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dililatum is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dililatum.  If not, see <http://www.gnu.org/licenses/>.
+
+##[ Name        ]## prefetch
+##[ Maintainer  ]## Niels G. W. Serup <ngws@metanohi.name>
+##[ Description ]## Contains the Prefetcher class, which loads the
+                  # places next to the current place in the background
+
+from collections import OrderedDict
+from Queue import Queue, Empty
+from dililatum.various import thread
+
+class Prefetcher:
+    # Images and walkability maps of the places that the current place
+    # leads to are read and decoded by a worker thread. The results
+    # are handed back to the main thread, which converts them to the
+    # format of the display. Places that are not current are unloaded
+    # again, least recently visited first, when they take up more than
+    # maxbytes.
+    def __init__(self, world, maxbytes):
+        self.world = world
+        self.maxbytes = maxbytes
+        self.requests = None
+        self.results = Queue()
+        self.pending = set()
+        self.held = OrderedDict()
+        self.size = 0
+        self.current = None
+        self.prefetched = 0
+        self.used = 0
+        self.evictions = 0
+
+    def start_worker(self):
+        self.requests = Queue()
+        thread(self.work)
+
+    def work(self):
+        while True:
+            place = self.requests.get()
+            if place is None:
+                break
+            self.results.put((place, place.read_imgfile(),
+                              place.read_posfile()))
+
+    def visit(self, place):
+        # Called whenever the current place changes
+        if self.current is not None and self.current is not place and \
+                self.current.is_loaded():
+            self.hold(self.current)
+        self.current = place
+        if place in self.held:
+            self.size -= self.held.pop(place)
+            self.used += 1
+        for p in place.get_neighbours():
+            if p in self.held:
+                self.held[p] = self.held.pop(p)
+            elif p not in self.pending and not p.is_loaded():
+                if self.requests is None:
+                    self.start_worker()
+                self.pending.add(p)
+                self.requests.put(p)
+        self.shrink()
+
+    def hold(self, place):
+        nbytes = place.get_loaded_bytes()
+        self.size += nbytes - self.held.pop(place, 0)
+        self.held[place] = nbytes
+
+    def collect(self):
+        # Called by the main thread once per frame
+        while self.pending:
+            try:
+                place, surf, posoks = self.results.get_nowait()
+            except Empty:
+                break
+            self.pending.discard(place)
+            place.use_loaded(surf, posoks)
+            self.prefetched += 1
+            if place is not self.current:
+                self.hold(place)
+                self.shrink()
+
+    def shrink(self):
+        while self.size > self.maxbytes and self.held:
+            place, nbytes = self.held.popitem(last=False)
+            self.size -= nbytes
+            place.unload()
+            self.evictions += 1
+
+    def stop(self):
+        if self.requests is not None:
+            self.requests.put(None)
+
+    def stats(self):
+        return dict(prefetched=self.prefetched, used=self.used,
+                    evictions=self.evictions, entries=len(self.held),
+                    bytes=self.size)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Dililatum: a quest system for simple RPGs
+# Copyright (C) 2010  Niels G. W. Serup
+
+# This file is part of Dililatum.
+#
+# Dililatum is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dililatum is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dililatum.  If not, see <http://www.gnu.org/licenses/>.
+
+##[ Name        ]## profiler
+##[ Maintainer  ]## Niels G. W. Serup <ngws@metanohi.name>
+##[ Description ]## Contains the Profiler class, which measures how
+                  # long the phases of every frame take
+
+import time
+import pygame
+
+# events: dispatching input, update: the fixed steps of the game,
+# place: the background, sprites: characters and objects, msgboxes:
+# message boxes, scale: scaling the canvas and drawing bars, present:
+# flipping or updating the display, other: everything else, such as
+# waiting for the next frame and signal handlers
+PHASES = ('events', 'update', 'place', 'sprites', 'msgboxes', 'scale',
+          'present', 'other')
+
+class Profiler:
+    # The time of every phase of the last frames is kept in ring
+    # buffers of the given length. lap(phase) adds the time since the
+    # last lap to phase.
+    def __init__(self, length=120):
+        self.length = length
+        self.buffers = dict((p, [0.0] * length) for p in PHASES)
+        self.totals = [0.0] * length
+        self.index = 0
+        self.count = 0
+        self.current = dict.fromkeys(PHASES, 0.0)
+        self.started = None
+        self.last = time.time()
+        self.sprites = 0
+
+    def begin_frame(self):
+        # Laps before the first frame (when the profiler is created in
+        # the middle of one) are thrown away
+        now = time.time()
+        if self.started is not None:
+            self.end_frame(now)
+        else:
+            self.current = dict.fromkeys(PHASES, 0.0)
+        self.started = self.last = now
+
+    def lap(self, phase):
+        now = time.time()
+        self.current[phase] += now - self.last
+        self.last = now
+
+    def end_frame(self, now):
+        total = now - self.started
+        current = self.current
+        current['other'] += now - self.last
+        i = self.index
+        for p in PHASES:
+            self.buffers[p][i] = current[p]
+            current[p] = 0.0
+        self.totals[i] = total
+        self.index = (i + 1) % self.length
+        self.count = min(self.count + 1, self.length)
+
+    def get_averages(self):
+        # Milliseconds per phase and in total, over the buffered frames
+        n = max(1, self.count)
+        frames = range(self.count)
+        avgs = dict((p, sum(self.buffers[p][i] for i in frames) * 1000 / n)
+                    for p in PHASES)
+        avgs['frame'] = sum(self.totals[i] for i in frames) * 1000 / n
+        return avgs
+
+    def get_fps(self):
+        frame = self.get_averages()['frame']
+        if not frame:
+            return 0.0
+        return 1000 / frame
+
+    def get_summary(self):
+        avgs = self.get_averages()
+        return '%.1f fps, %.2f ms per frame: ' % (self.get_fps(),
+                                                  avgs['frame']) + \
+            ', '.join('%s %.2f' % (p, avgs[p]) for p in PHASES) + \
+            '; %d sprites' % self.sprites
+
+class ProfilerHUD:
+    # A box of text in the top left corner of the screen
+    def __init__(self, world):
+        self.world = world
+        self.font = pygame.font.Font(None, 18)
+
+    def get_lines(self, prof):
+        world = self.world
+        avgs = prof.get_averages()
+        lines = ['%.1f fps  %.2f ms  %d sprites' %
+                 (prof.get_fps(), avgs['frame'], prof.sprites)]
+        lines.extend('%-9s %6.2f ms' % (p, avgs[p]) for p in PHASES)
+        caches = [('frames', world.frame_cache.stats()),
+                  ('images', world.image_cache.stats())]
+        if world.sys.etc.zoom != 1 and world.canvas is None:
+            caches.append(('zoom', world.scale_cache.stats()))
+        for name, stats in caches:
+            looks = stats['hits'] + stats['misses']
+            if looks:
+                lines.append('%-9s %5.1f%% hits' %
+                             (name, stats['hits'] * 100.0 / looks))
+        return lines
+
+    def draw(self, surf, prof):
+        lines = self.get_lines(prof)
+        height = self.font.get_linesize()
+        rendered = [self.font.render(l, True, (255, 255, 255))
+                    for l in lines]
+        width = max(r.get_width() for r in rendered) + 8
+        box = pygame.Surface((width, height * len(lines) + 8))
+        box.set_alpha(190)
+        surf.blit(box, (0, 0))
+        for i, r in enumerate(rendered):
+            surf.blit(r, (4, 4 + i * height))
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Dililatum: a quest system for simple RPGs
+# Copyright (C) 2010  Niels G. W. Serup
+
+# This file is part of Dililatum.
+#
+# Dililatum is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dililatum is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dililatum.  If not, see <http://www.gnu.org/licenses/>.
+
+##[ Name        ]## recorder
+##[ Maintainer  ]## Niels G. W. Serup <ngws@metanohi.name>
+##[ Description ]## Contains the Recorder and Replayer classes, which
+                  # save and play back the input of a game
+
+# A recording starts with a header of MAGIC, the tick rate and the
+# frame rate of the game. Then follows one record per frame: the
+# milliseconds the frame took and the number of events, and for every
+# event its type and the length of its marshalled attributes followed
+# by the attributes themselves. Attributes that cannot be marshalled
+# are left out. Times are stored as doubles, so that replaying gives
+# the same fixed steps of the game as recording did.
+
+import marshal
+import struct
+import pygame
+from pygame.locals import *
+
+MAGIC = 'DLLTREC2'
+HEADER = struct.Struct('<8sdd')
+FRAME = struct.Struct('<dH')
+EVENT = struct.Struct('<HI')
+
+def dump_event_dict(d):
+    try:
+        return marshal.dumps(d)
+    except ValueError:
+        ok = {}
+        for k, v in d.items():
+            try:
+                marshal.dumps(v)
+                ok[k] = v
+            except ValueError:
+                pass
+        return marshal.dumps(ok)
+
+class Recorder:
+    def __init__(self, path, tickrate, fps):
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, tickrate, fps))
+        self.frames = 0
+
+    def record(self, frame_time, events):
+        # frame_time is in milliseconds
+        self.file.write(FRAME.pack(frame_time, len(events)))
+        for event in events:
+            data = dump_event_dict(event.dict)
+            self.file.write(EVENT.pack(event.type, len(data)))
+            self.file.write(data)
+        self.frames += 1
+
+    def close(self):
+        self.file.close()
+
+class Replayer:
+    # Works as the clock of the world. Every tick reads the next frame
+    # of the recording, and takes as long as that frame took when it
+    # was recorded, unless fast is true, in which case it takes no
+    # time at all.
+    def __init__(self, path, fast=False):
+        self.file = open(path, 'rb')
+        magic, self.tickrate, self.fps = HEADER.unpack(
+            self.file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError('%s is not a Dililatum recording' % path)
+        self.fast = fast
+        self.clock = pygame.time.Clock()
+        self.frame_time = 0
+        self.events = []
+        self.frames = 0
+        self.finished = False
+
+    def tick(self, framerate=0):
+        data = self.file.read(FRAME.size)
+        if len(data) < FRAME.size:
+            self.finished = True
+            self.frame_time = 0
+            self.events = []
+            return 0
+        self.frame_time, n = FRAME.unpack(data)
+        self.events = []
+        for i in range(n):
+            etype, length = EVENT.unpack(self.file.read(EVENT.size))
+            self.events.append(pygame.event.Event(
+                    etype, marshal.loads(self.file.read(length))))
+        self.frames += 1
+        if not self.fast:
+            self.clock.tick()
+            wait = self.frame_time - self.clock.get_time()
+            if wait > 0:
+                pygame.time.wait(int(wait))
+            self.clock.tick()
+        return self.frame_time
+
+    def get_time(self):
+        return self.frame_time
+
+    def get_events(self):
+        return self.events
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Dililatum: a quest system for simple RPGs
+# Copyright (C) 2010  Niels G. W. Serup
+
+# This file is part of Dililatum.
+#
+# Dililatum is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dililatum is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dililatum.  If not, see <http://www.gnu.org/licenses/>.
+
+##[ Name        ]## renderlist
+##[ Maintainer  ]## Niels G. W. Serup <ngws@metanohi.name>
+##[ Description ]## Contains the RenderList class, which keeps
+                  # drawables sorted by depth
+
+from bisect import bisect_left
+
+class RenderList:
+    # Drawables sorted by their depth (the y coordinate of their
+    # bottom). Every drawable also has a sequence number from when the
+    # list was built, so that drawables at the same depth keep their
+    # original order, just like a stable sort would.
+    def __init__(self):
+        self.keys = []
+        self.items = []
+        self.entries = {}
+
+    def rebuild(self, objs, depth):
+        entries = [(depth(o), i, o) for i, o in enumerate(objs)]
+        entries.sort()
+        self.keys = [(d, i) for d, i, o in entries]
+        self.items = [o for d, i, o in entries]
+        self.entries = dict((o, (d, i)) for d, i, o in entries)
+
+    def move(self, obj, depth):
+        old = self.entries[obj]
+        if old[0] == depth:
+            return
+        i = bisect_left(self.keys, old)
+        del self.keys[i]
+        del self.items[i]
+        new = (depth, old[1])
+        i = bisect_left(self.keys, new)
+        self.keys.insert(i, new)
+        self.items.insert(i, obj)
+        self.entries[obj] = new
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
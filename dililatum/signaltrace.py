@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Dililatum: a quest system for simple RPGs
+# Copyright (C) 2010  Niels G. W. Serup
+
+# This file is part of Dililatum.
+#
+# Dililatum is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dililatum is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dililatum.  If not, see <http://www.gnu.org/licenses/>.
+
+##[ Name        ]## signaltrace
+##[ Maintainer  ]## Niels G. W. Serup <ngws@metanohi.name>
+##[ Description ]## Contains the SignalTracer class, which measures
+                  # how long signal and event handlers take
+
+import pygame
+
+def describe_signal(signal):
+    # Events are numbers
+    if isinstance(signal, int):
+        return pygame.event.event_name(signal)
+    return str(signal)
+
+def describe_handler(func):
+    module = getattr(func, '__module__', None) or '?'
+    name = getattr(func, '__name__', None) or repr(func)
+    owner = getattr(func, 'im_class', None)
+    if owner is not None:
+        name = owner.__name__ + '.' + name
+    return module + '.' + name
+
+class SignalTracer:
+    # Keeps the number of calls and the total and longest time of every
+    # (signal, handler) pair. Handlers whose longest call took at least
+    # slow seconds are flagged in reports.
+    def __init__(self, slow=0.005):
+        self.slow = slow
+        self.stats = {}
+
+    def record(self, signal, func, seconds):
+        key = (signal, func)
+        try:
+            s = self.stats[key]
+        except KeyError:
+            s = self.stats[key] = [0, 0.0, 0.0]
+        s[0] += 1
+        s[1] += seconds
+        if seconds > s[2]:
+            s[2] = seconds
+
+    def get_report(self, top=None):
+        rows = sorted(self.stats.items(), key=lambda x: -x[1][1])
+        if top:
+            rows = rows[:top]
+        lines = ['%-6s %9s %9s %9s  %s' % ('calls', 'total ms', 'mean ms',
+                                           'max ms', 'signal: handler')]
+        for (signal, func), (count, total, longest) in rows:
+            line = '%6d %9.2f %9.3f %9.3f  %s: %s' % (
+                count, total * 1000, total * 1000 / count, longest * 1000,
+                describe_signal(signal), describe_handler(func))
+            if longest >= self.slow:
+                line += '  SLOW'
+            lines.append(line)
+        return '\n'.join(lines)
+
+    def clear(self):
+        self.stats.clear()
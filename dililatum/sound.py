@@ -38,7 +38,7 @@ class Sound:
             self.snd = None
 
     def load_sound(self):
-        self.snd = pygame.mixer.Sound(self.path)
+        self.snd = self.world.loader.load('sound', self.path)
 
     def play(self):
         if self.world.sys.etc.mute: return
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Dililatum: a quest system for simple RPGs
+# Copyright (C) 2010  Niels G. W. Serup
+
+# This file is part of Dililatum.
+#
+# Dililatum is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dililatum is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dililatum.  If not, see <http://www.gnu.org/licenses/>.
+
+##[ Name        ]## spatial
+##[ Maintainer  ]## Niels G. W. Serup <ngws@metanohi.name>
+##[ Description ]## Contains the SpatialGrid class, which finds the
+                  # things that are near a rectangle
+
+class SpatialGrid:
+    # A uniform grid of cells, each knowing the things whose
+    # rectangles overlap it. Things without a usable rectangle are
+    # always returned.
+    def __init__(self, cellsize=64):
+        self.cellsize = cellsize
+        self.cells = {}
+        self.always = set()
+
+    def cell_range(self, a, b):
+        return range(int(a // self.cellsize), int(b // self.cellsize) + 1)
+
+    def insert(self, obj, x1, y1, x2, y2):
+        for cx in self.cell_range(x1, x2):
+            for cy in self.cell_range(y1, y2):
+                try:
+                    self.cells[(cx, cy)].append(obj)
+                except KeyError:
+                    self.cells[(cx, cy)] = [obj]
+
+    def insert_always(self, obj):
+        self.always.add(obj)
+
+    def query(self, x1, y1, x2, y2):
+        found = set(self.always)
+        for cx in self.cell_range(x1, x2):
+            for cy in self.cell_range(y1, y2):
+                try:
+                    found.update(self.cells[(cx, cy)])
+                except KeyError:
+                    pass
+        return found
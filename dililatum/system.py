@@ -25,10 +25,16 @@
 
 import sys
 import os
+import time
 from datetime import datetime
-from pygame.locals import MOUSEMOTION, MOUSEBUTTONUP, MOUSEBUTTONDOWN
+from thread import get_ident
+import pygame
+from pygame.locals import QUIT, ACTIVEEVENT, VIDEOEXPOSE, VIDEORESIZE, \
+    KEYDOWN, KEYUP, MOUSEMOTION, MOUSEBUTTONUP, MOUSEBUTTONDOWN, \
+    JOYAXISMOTION, JOYBALLMOTION, JOYHATMOTION, JOYBUTTONDOWN, JOYBUTTONUP
 import dililatum.various as various
 from dililatum.statusprinter import StatusPrinter
+from dililatum.signaltrace import SignalTracer
 
 
 class Event:
@@ -43,32 +49,119 @@ class Event:
                                               str(self.uargs))
 
 class SignalDict(dict):
-    def add(self, signal, *func_and_args):
-        try:
-            self.__getitem__(signal).append(func_and_args)
-        except KeyError:
-            self.__setitem__(signal, [func_and_args])
+    # Maps signals to tuples of (function, user arguments) pairs. The
+    # tuples are replaced, never changed, when handlers are added or
+    # removed, so they can be run without copying them first, even if
+    # a handler adds or removes handlers.
+
+    # Set tracer to a SignalTracer to measure every handler
+    tracer = None
+
+    def add(self, signal, func, *args):
+        self.__setitem__(signal, self.get(signal, ()) + ((func, args),))
 
     def remove(self, signal, func):
         d = self.__getitem__(signal)
-        for x in d:
-            if x[0] == func:
-                d.remove(x)
+        for i in range(len(d)):
+            if d[i][0] == func:
+                self.__setitem__(signal, d[:i] + d[i + 1:])
                 break
 
     def run(self, signal, obj):
+        handlers = self.get(signal)
+        if handlers:
+            self.run_handlers(signal, handlers, obj)
+
+    def run_handlers(self, signal, handlers, obj):
+        tracer = self.tracer
         try:
-            for func in self.__getitem__(signal)[:]:
+            for func, args in handlers:
                 try:
-                    obj.uargs = func[1:]
+                    obj.uargs = args
                 except Exception:
                     pass
-                func[0](obj)
+                if tracer is None:
+                    func(obj)
+                else:
+                    started = time.time()
+                    func(obj)
+                    tracer.record(signal, func, time.time() - started)
         except KeyError:
             pass
 
     def clear(self, signal):
-        self.__setitem__(signal, [])
+        self.__setitem__(signal, ())
+
+# Event types that are dropped by pygame when nothing handles them.
+# Other types, e.g. QUIT, VIDEOEXPOSE and ACTIVEEVENT, always get through.
+FILTERED_EVENTS = (MOUSEMOTION, MOUSEBUTTONDOWN, MOUSEBUTTONUP,
+                   KEYDOWN, KEYUP, JOYAXISMOTION, JOYBALLMOTION,
+                   JOYHATMOTION, JOYBUTTONDOWN, JOYBUTTONUP, VIDEORESIZE)
+ALLOWED_EVENTS = (QUIT, VIDEOEXPOSE, ACTIVEEVENT)
+
+class EventDict(SignalDict):
+    # Handlers of pygame events. Handlers can also be linked to a
+    # single key of an event type, in which case they are only run for
+    # events with that key. The event types having handlers are
+    # remembered, so that pygame can be told to drop the others.
+    def __init__(self):
+        SignalDict.__init__(self)
+        self.keyed = {}
+        self.filter_changed = True
+
+    def add(self, type, func, *args):
+        SignalDict.add(self, type, func, *args)
+        self.filter_changed = True
+
+    def remove(self, type, func):
+        SignalDict.remove(self, type, func)
+        self.filter_changed = True
+
+    def clear(self, type):
+        SignalDict.clear(self, type)
+        self.filter_changed = True
+
+    def add_keyed(self, type, key, func, *args):
+        self.keyed[(type, key)] = \
+            self.keyed.get((type, key), ()) + ((func, args),)
+        self.filter_changed = True
+
+    def remove_keyed(self, type, key, func):
+        d = self.keyed[(type, key)]
+        for i in range(len(d)):
+            if d[i][0] == func:
+                self.keyed[(type, key)] = d[:i] + d[i + 1:]
+                break
+        self.filter_changed = True
+
+    def run(self, type, obj):
+        # Both kinds of handlers are found before any of them are run,
+        # so handlers added by them wait for the next event
+        handlers = self.get(type)
+        try:
+            keyed = self.keyed.get((type, obj.key))
+        except AttributeError:
+            keyed = None
+        if keyed:
+            self.run_handlers(type, keyed, obj)
+        if handlers:
+            self.run_handlers(type, handlers, obj)
+
+    def get_types(self):
+        types = set(t for t, d in self.items() if d)
+        types.update(t for (t, k), d in self.keyed.items() if d)
+        return types
+
+    def update_filter(self):
+        # pygame must have been initialized
+        if not self.filter_changed:
+            return
+        self.filter_changed = False
+        types = self.get_types()
+        pygame.event.set_allowed([t for t in FILTERED_EVENTS if t in types])
+        pygame.event.set_blocked([t for t in FILTERED_EVENTS
+                                  if t not in types])
+        pygame.event.set_allowed(list(ALLOWED_EVENTS))
 
 class System:
     def __init__(self, etc, error=None):
@@ -78,7 +171,23 @@ class System:
         else:
             self.error = error
         self.signalactions = SignalDict()
-        self.gameactions = SignalDict()
+        self.gameactions = EventDict()
+        # Events are reused by the main thread; one for each level of
+        # signals emitted by handlers of other signals. Other threads,
+        # e.g. those playing sounds, get new events.
+        self.main_thread = get_ident()
+        self.event_pool = []
+        self.emit_depth = 0
+        if self.etc.tracesignals:
+            self.tracer = SignalTracer(self.etc.slowhandler / 1000.0)
+            self.signalactions.tracer = self.tracer
+            self.gameactions.tracer = self.tracer
+            self.trace_reported = time.time()
+            if self.etc.traceinterval > 0:
+                self.signalactions.add('aftergameloop',
+                                       self.report_live_trace)
+        else:
+            self.tracer = None
 
         self.status = StatusPrinter('SYSTEM', self.etc, 'white', 'red')
         self.status('''\
@@ -104,11 +213,28 @@ There is NO WARRANTY, to the extent permitted by law. See
             mod.main()
         self.emit_signal('aftersysteminit', self)
 
-    def emit_signal(self, *signal_and_args):
-        signal = signal_and_args[0]
-        args = signal_and_args[1:]
-        event = Event(signal, args)
-        self.signalactions.run(signal, event)
+    def emit_signal(self, signal, *args):
+        handlers = self.signalactions.get(signal)
+        if not handlers:
+            return
+        if get_ident() != self.main_thread:
+            self.signalactions.run_handlers(signal, handlers,
+                                            Event(signal, args))
+            return
+        depth = self.emit_depth
+        try:
+            event = self.event_pool[depth]
+        except IndexError:
+            event = Event()
+            self.event_pool.append(event)
+        event.name = signal
+        event.args = args
+        self.emit_depth = depth + 1
+        try:
+            self.signalactions.run_handlers(signal, handlers, event)
+        finally:
+            self.emit_depth = depth
+            event.args = ()
 
     def emit_event(self, *event_and_type):
         if self.etc.zoom != 1 and \
@@ -118,6 +244,13 @@ There is NO WARRANTY, to the extent permitted by law. See
             event_and_type[1] = [x / self.etc.zoom for x in event_and_type[1].pos]
         self.gameactions.run(*event_and_type)
 
+    def report_live_trace(self, event):
+        now = time.time()
+        if now - self.trace_reported >= self.etc.traceinterval:
+            self.trace_reported = now
+            self.status('Slowest signal handlers so far:\n' +
+                        self.tracer.get_report(self.etc.tracetop))
+
     def start(self):
         self.emit_signal('beforesystemstart', self)
         self.status('Starting system...')
@@ -166,3 +299,6 @@ There is NO WARRANTY, to the extent permitted by law. See
         self.status('Stopping game...')
         self.game.end()
         self.emit_signal('aftersystemend', self)
+        if self.tracer is not None:
+            self.status('Signal handlers:\n' +
+                        self.tracer.get_report(self.etc.tracetop))
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Dililatum: a quest system for simple RPGs
+# Copyright (C) 2010  Niels G. W. Serup
+
+# This file is part of Dililatum.
+#
+# Dililatum is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dililatum is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dililatum.  If not, see <http://www.gnu.org/licenses/>.
+
+##[ Name        ]## timer
+##[ Maintainer  ]## Niels G. W. Serup <ngws@metanohi.name>
+##[ Description ]## Contains the Scheduler class, which calls functions
+                  # when their timers run out
+
+import heapq
+
+class Timer:
+    def __init__(self, duration, func, args, repeat):
+        # duration is either a number of microseconds or an object
+        # with a duration attribute, which is then read every time
+        # the timer is started.
+        self.duration = duration
+        self.func = func
+        self.args = args
+        self.repeat = repeat
+        self.due = None
+        self.active = False
+        self.seq = None
+
+    def get_duration(self):
+        try:
+            return self.duration.duration
+        except AttributeError:
+            return self.duration
+
+class Scheduler:
+    # Timers are kept in a heap ordered by when they are due, so
+    # running the scheduler only costs something for the timers that
+    # are actually due. Cancelled and rescheduled timers leave stale
+    # entries in the heap which are skipped when they come up.
+    def __init__(self, clock):
+        self.clock = clock
+        self.heap = []
+        self.seq = 0
+
+    def add(self, duration, func, *args, **oargs):
+        timer = Timer(duration, func, args, oargs.get('repeat', False))
+        self.schedule(timer)
+        return timer
+
+    def schedule(self, timer, now=None):
+        if now is None:
+            now = self.clock()
+        self.seq += 1
+        timer.seq = self.seq
+        timer.due = now + timer.get_duration()
+        timer.active = True
+        heapq.heappush(self.heap, (timer.due, timer.seq, timer))
+
+    def cancel(self, timer):
+        timer.active = False
+        timer.due = None
+
+    def reschedule(self, timer, duration=None):
+        if duration is not None:
+            timer.duration = duration
+        self.schedule(timer)
+
+    def run(self):
+        now = self.clock()
+        heap = self.heap
+        while heap and heap[0][0] < now:
+            due, seq, timer = heapq.heappop(heap)
+            if not timer.active or timer.seq != seq:
+                continue
+            if timer.repeat:
+                self.schedule(timer, now)
+            else:
+                timer.active = False
+            timer.func(*timer.args)
+
+    def __len__(self):
+        return len([t for d, s, t in self.heap
+                    if t.active and t.seq == s])
+
+class VirtualClock:
+    # A stand-in for pygame.time.Clock which never waits. Every tick
+    # takes exactly one frame at the given frame rate, or at rate if
+    # the frame rate is 0, so runs are the same every time.
+    def __init__(self, rate=30):
+        self.rate = rate
+        self.frame_time = 0
+        self.ticks = 0
+
+    def tick(self, framerate=0):
+        if not framerate:
+            framerate = self.rate
+        self.frame_time = 1000.0 / framerate
+        self.ticks += 1
+        return self.frame_time
+
+    def get_time(self):
+        return self.frame_time
+
+    def get_fps(self):
+        if not self.frame_time:
+            return 0.0
+        return 1000.0 / self.frame_time
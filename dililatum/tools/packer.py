@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Dililatum: a quest system for simple RPGs
+# Copyright (C) 2010  Niels G. W. Serup
+
+# This file is part of Dililatum.
+#
+# Dililatum is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dililatum is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dililatum.  If not, see <http://www.gnu.org/licenses/>.
+
+##[ Name        ]## packer
+##[ Maintainer  ]## Niels G. W. Serup <ngws@metanohi.name>
+##[ Description ]## Packs the data directory of a game into one
+                  # archive
+
+import os
+import marshal
+import pygame
+from pygame.locals import *
+from dililatum.archive import MAGIC, HEADER, ALIGN
+
+IMAGE_SUFFIXES = ('jpg', 'jpeg', 'png', 'gif', 'tga', 'bmp')
+
+class DataPacker:
+    def __init__(self, datadir, output, verbose=True):
+        self.datadir = os.path.abspath(datadir)
+        self.output = os.path.abspath(output)
+        self.verbose = verbose
+        self.files = {}
+        self.dirs = {}
+
+    def encode(self, path):
+        suffix = path.rsplit('.', 1)[-1].lower()
+        if suffix in IMAGE_SUFFIXES:
+            try:
+                surf = pygame.image.load(path)
+            except Exception:
+                pass
+            else:
+                if surf.get_flags() & SRCALPHA:
+                    fmt = 'RGBA'
+                else:
+                    fmt = 'RGB'
+                # Palette and colorkey images keep their transparent
+                # color
+                colorkey = surf.get_colorkey()
+                if colorkey is not None:
+                    colorkey = tuple(colorkey)
+                return ('image', surf.get_size(), fmt, colorkey), \
+                    pygame.image.tostring(surf, fmt)
+        data = open(path, 'rb').read()
+        if suffix == 'dililatumpos':
+            return ('posmap',), data
+        return ('raw',), data
+
+    def pack(self):
+        out = open(self.output, 'wb')
+        out.write(HEADER.pack(MAGIC, 0, 0))
+        for root, dirs, files in os.walk(self.datadir):
+            dirs.sort()
+            name = os.path.relpath(root, self.datadir)
+            if name == os.curdir:
+                name = '.'
+            name = name.replace(os.sep, '/')
+            files = sorted(f for f in files if
+                           os.path.join(os.path.abspath(root), f) !=
+                           self.output)
+            self.dirs[name] = (dirs[:], files)
+            for f in files:
+                if name == '.':
+                    key = f
+                else:
+                    key = name + '/' + f
+                info, data = self.encode(os.path.join(root, f))
+                offset = out.tell()
+                padding = -offset % ALIGN
+                out.write('\0' * padding)
+                offset += padding
+                out.write(data)
+                self.files[key] = (info[0], offset, len(data)) + info[1:]
+                if self.verbose:
+                    print '%s (%s, %d bytes)' % (key, info[0], len(data))
+        index = marshal.dumps({'files': self.files, 'dirs': self.dirs})
+        offset = out.tell()
+        out.write(index)
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, offset, len(index)))
+        out.close()
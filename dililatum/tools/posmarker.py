@@ -26,6 +26,7 @@
                   # safely walk
 
 import sys
+import numpy
 import pygame
 from pygame.locals import *
 from dililatum.bitmap import BitMap
@@ -50,32 +51,20 @@ class NewSurface(pygame.Surface):
 
     def add_rect(self, pos, size):
         s2 = size / 2
-        x1 = pos[0] - s2
-        y1 = pos[1] - s2
-        x2 = pos[0] + s2
-        y2 = pos[1] + s2
-        if x1 < 0: x1 = 0
-        if y1 < 0: y1 = 0
-
-        for i in range(y1, y2):
-            if i >= self.y: break
-            for j in range(x1, x2):
-                if j >= self.x: break
-                if not self.positions.get(j, i):
-                    self.set_at(j, i)
-                    self.positions.set(j, i)
+        x1 = max(pos[0] - s2, 0)
+        y1 = max(pos[1] - s2, 0)
+        rect = pygame.Rect(x1, y1, pos[0] + s2 - x1, pos[1] + s2 - y1)
+        self.fill(self.color, rect)
+        self.positions.set_area(rect.left, rect.top, rect.right, rect.bottom)
 
     def del_rect(self, pos, size):
         s2 = size / 2
-        x1 = pos[0] - s2
-        y1 = pos[1] - s2
-        x2 = pos[0] + s2
-        y2 = pos[1] + s2
-
-        for i in range(y1, y2):
-            for j in range(x1, x2):
-                self.del_at(j, i)
-                self.positions.unset(j, i)
+        x1 = max(pos[0] - s2, 0)
+        y1 = max(pos[1] - s2, 0)
+        rect = pygame.Rect(x1, y1, pos[0] + s2 - x1, pos[1] + s2 - y1)
+        self.fill(self.none, rect)
+        self.positions.set_area(rect.left, rect.top, rect.right, rect.bottom,
+                                False)
 
 class OKPositionsMarker:
     def __init__(self, imgfile, posfile):
@@ -95,10 +84,8 @@ class OKPositionsMarker:
 
         try:
             self.positions.load(self.posfile)
-            for i in xrange(480):
-                for j in xrange(640):
-                    if self.positions.get(j, i):
-                        self.points.set_at(j, i)
+            for j, i in zip(*numpy.nonzero(self.positions.bits)):
+                self.points.set_at(j, i)
         except Exception:
             pass
 
@@ -106,7 +93,7 @@ class OKPositionsMarker:
         self.loop()
 
     def end(self):
-        self.positions.arr.tofile(self.posfile)
+        self.positions.save(self.posfile)
 
     def loop(self):
         done = False
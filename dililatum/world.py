@@ -24,8 +24,10 @@
 ##[ Description ]## Contains the World class, controlling display
                   # output as well as key detection
 
-from datetime import datetime
+import math
 import os.path
+import time
+from collections import OrderedDict
 import pygame
 from pygame.locals import *
 from dililatum.character import Character, EmptyCharacter
@@ -35,28 +37,38 @@ from dililatum.font import Font
 from dililatum.sound import Sound
 from dililatum.msgbox import MessageBox, MessageContainer
 from dililatum.statusprinter import StatusPrinter
+from dililatum.cache import ScaleCache, FrameCache, AssetCache
+from dililatum.timer import Scheduler, VirtualClock
+from dililatum.renderlist import RenderList
+from dililatum.pathfind import PathFinder
+from dililatum.prefetch import Prefetcher
+from dililatum.loader import AssetLoader
+from dililatum.archive import open_archive
+from dililatum.atlas import AtlasCache, get_frames, pack_frames
+from dililatum.recorder import Recorder, Replayer
+from dililatum.profiler import Profiler, ProfilerHUD
+from dililatum.keytable import KeyTable
 from dililatum.various import thread
 
-microseconds = lambda tdelta: tdelta.microseconds
-class TimeCounter:
-    def __init__(self, obj, func):
-        self.obj = obj
-        self.func = func
-        self.start = self.reset
-
-    def reset(self):
-        self.time = datetime.now()
-
-    def think(self):
-        if microseconds(datetime.now() - self.time) > \
-                self.obj.duration:
-            self.func()
-            self.reset()
+# The longest time (in microseconds) a single frame may advance the
+# game, so that the game does not race to catch up after a stall
+MAX_FRAME_TIME = 250000
 
 class Duration:
     def __init__(self, dur):
         self.duration = dur * 1000
 
+def merge_rects(rects):
+    merged = []
+    for r in rects:
+        r = pygame.Rect(r)
+        i = r.collidelist(merged)
+        while i != -1:
+            r.union_ip(merged.pop(i))
+            i = r.collidelist(merged)
+        merged.append(r)
+    return merged
+
 class World:
     default_character_moving_keys = dict(
         cb=[K_DOWN],
@@ -76,30 +88,73 @@ class World:
         self.sys = stm
         self.size = size
         self.real_size = tuple(self.size[:])
-        self.loaded_images = {}
+        self.image_cache = AssetCache(
+            int(self.sys.etc.imagecache * 1024 * 1024))
+        try:
+            self.archive = open_archive(self.sys.etc.archive,
+                                        self.sys.error)
+        except Exception, e:
+            self.sys.error('cannot open archive: %s' % e)
+            self.archive = None
+        self.atlas = None
+        if self.sys.etc.atlascache is not None:
+            self.atlas_cache = AtlasCache(self.sys.etc.atlascache,
+                                          self.archive)
+        else:
+            self.atlas_cache = None
+        self.loader = AssetLoader(self, self.sys.etc.loadthreads)
+        self.scale_cache = ScaleCache(int(self.sys.etc.zoomcache * 1024 * 1024))
+        self.frame_cache = FrameCache(self.sys.etc.scalestep)
         self.objects = []
         self.sounds = []
         self.characters = []
         self.leading_character = EmptyCharacter()
         self.leading_character_direction = None
-        self.character_moving_keys = get('charkeys',
-                                         self.default_character_moving_keys)
+        self.set_character_moving_keys(
+            get('charkeys', self.default_character_moving_keys))
         self.walking_speed = get('walkspeed', Duration(100))
         self.msgboxes = []
         self.default_msgbox = None
         self.counters = []
+        self.time = 0
+        self.timers = Scheduler(self.get_time)
+        self.lag = 0.0
         self.places = []
         self.current_place = None
+        self.pathfinder = PathFinder()
+        if self.sys.etc.loadwait or self.sys.etc.prefetchsize <= 0:
+            self.prefetcher = None
+        else:
+            self.prefetcher = Prefetcher(
+                self, int(self.sys.etc.prefetchsize * 1024 * 1024))
         self.running = False
         self.quitting = False
         self.status = StatusPrinter('WORLD', self.sys.etc, 'cyan', 'blue')
         self.link_event = self.sys.gameactions.add
         self.unlink_event = self.sys.gameactions.remove
-        self.keys_down = []
+        self.link_key_event = self.sys.gameactions.add_keyed
+        self.unlink_key_event = self.sys.gameactions.remove_keyed
+        self.triggers = set()
+        # Held keys in the order they were pressed (the values are not
+        # used)
+        self.keys_down = OrderedDict()
         self.screen_offset = [0, 0]
         self.screen_bars = [None, None]
         self.keys_locked = False
         self.event = {}
+        self.render_list = RenderList()
+        self.render_place = None
+        self.render_count = None
+        self.draw_states = {}
+        self.drawn_place = None
+        self.full_redraw = True
+        # Nothing is measured without a profiler
+        if self.sys.etc.profile:
+            self.profiler = Profiler()
+        else:
+            self.profiler = None
+        self.hud = None
+        self.profile_reported = None
         self.sys.emit_signal('afterworldinit', self)
 
     def start(self):
@@ -110,15 +165,34 @@ class World:
         self.link_event(KEYDOWN, self.key_builtin)
         self.link_event(KEYDOWN, self.lead_walk)
         self.link_event(KEYUP, self.lead_walk)
+        self.link_event(VIDEOEXPOSE, self.redraw)
 
-        self.counters.append(TimeCounter(self.walking_speed, self.check_lead_walk))
+        self.add_counter(self.walking_speed, self.check_lead_walk)
 
         self.pygame_init()
         self.create_screen()
         self.fill_background((0, 0, 0))
         self.set_caption(self.sys.game.name)
 
-        self.innerclock = pygame.time.Clock()
+        self.recorder = None
+        self.replayer = None
+        if self.sys.etc.replay is not None:
+            # The recording is also the clock
+            self.replayer = Replayer(self.sys.etc.replay,
+                                     self.sys.etc.replayfast)
+            if (self.replayer.tickrate, self.replayer.fps) != \
+                    (self.sys.etc.tickrate, self.sys.etc.fps):
+                self.status('Recorded with a tick rate of %g and a frame \
+rate of %g, so the game may play out differently' %
+                            (self.replayer.tickrate, self.replayer.fps))
+            self.innerclock = self.replayer
+        elif self.sys.etc.headless is not None:
+            self.innerclock = VirtualClock(self.sys.etc.tickrate)
+        else:
+            self.innerclock = pygame.time.Clock()
+        if self.sys.etc.record is not None:
+            self.recorder = Recorder(self.sys.etc.record,
+                                     self.sys.etc.tickrate, self.sys.etc.fps)
         self.sys.emit_signal('afterworldstart', self)
 
     def pygame_init(self):
@@ -128,17 +202,28 @@ class World:
                                      # to 44.1 kHz
         pygame.mixer.init()
 
+    def get_mtime(self, path):
+        # Files in the archive never change
+        if self.archive is not None and self.archive.has(path):
+            return None
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
+
     def load_image(self, path, alpha=False):
         p = os.path.abspath(path)
-        if p not in self.loaded_images.values():
-            img = pygame.image.load(p)
+        key = (p, alpha, self.get_mtime(p))
+        img = self.image_cache.get(key)
+        if img is None:
+            img = self.loader.load('image', p)
             if alpha:
                 img = img.convert_alpha()
             else:
                 img = img.convert()
-            self.loaded_images[p] = img
+            self.image_cache.put(key, img)
         else:
-            img = self.loaded_images[p]
+            self.loader.discard('image', p)
         return img
 
     def create_screen(self):
@@ -148,7 +233,7 @@ class World:
             flags = FULLSCREEN
             if etc.hwaccel:
                 flags = flags | HWSURFACE
-            if etc.doublebuf:
+            if etc.doublebuf and not etc.dirtyrects:
                 flags = flags | DOUBLEBUF
             self.screen = pygame.display.set_mode(self.size, flags)
         elif etc.fakefullscreen or etc.size is not None:
@@ -178,17 +263,15 @@ class World:
                 self.screen_offset[b] = int((size[b] - self.size[b] * etc.zoom) / 2)
                 barsize = [0, 0]
                 barsize[a] = size[a]
-                barsize[b] = self.screen_offset[b]
+                barsize[b] = size[b] - int(self.size[b] * etc.zoom) - \
+                    self.screen_offset[b]
             self.real_size = size
             self.status('Modified size of game is: %dx%d' % tuple(self.real_size))
-            flags = None
+            flags = 0
             if not etc.border or etc.fakefullscreen:
                 flags = NOFRAME
-            if etc.doublebuf:
-                if flags is not None:
-                    flags = flags | DOUBLEBUF
-                else:
-                    flags = DOUBLEBUF
+            if etc.doublebuf and not etc.dirtyrects:
+                flags = flags | DOUBLEBUF
             try:
                 self.screen = pygame.display.set_mode(self.real_size, flags)
             except pygame.error:
@@ -203,14 +286,11 @@ class World:
             if etc.zoom != 1:
                 self.real_size = [int(x * etc.zoom) for x in self.size]
                 self.status('Scaled size of game is: %dx%d' % tuple(self.real_size))
-            flags = None
+            flags = 0
             if not etc.border or etc.fakefullscreen:
                 flags = NOFRAME
-            if etc.doublebuf:
-                if flags is not None:
-                    flags = flags | DOUBLEBUF
-                else:
-                    flags = DOUBLEBUF
+            if etc.doublebuf and not etc.dirtyrects:
+                flags = flags | DOUBLEBUF
             try:
                 self.screen = pygame.display.set_mode(self.real_size, flags)
             except pygame.error:
@@ -220,13 +300,41 @@ class World:
                     flags = 0
                 self.screen = pygame.display.set_mode(self.real_size, flags)
 
-        self.bgsurface = pygame.Surface(self.real_size).convert()
+        self.canvas = None
+        if etc.compose is not None and etc.zoom != 1:
+            if etc.compose == 'nearest' and etc.zoom > 1:
+                self.use_integer_zoom()
+            self.canvas = pygame.Surface(self.size).convert()
+            self.canvas_area = self.screen.subsurface(
+                self.screen_offset, [int(s * etc.zoom) for s in self.size])
+            self.target = self.canvas
+        else:
+            self.target = self.screen
+
+        self.bgsurface = pygame.Surface(self.target.get_size()).convert()
+        self.full_redraw = True
+
+    def use_integer_zoom(self):
+        # Nearest neighbour scaling only looks right with an integer
+        # zoom; the rest of the screen is covered by bars.
+        self.sys.etc.zoom = float(int(self.sys.etc.zoom))
+        scaled = [int(s * self.sys.etc.zoom) for s in self.size]
+        self.screen_bars = [None, None]
+        for i in range(2):
+            self.screen_offset[i] = (self.real_size[i] - scaled[i]) / 2
+            gap = self.real_size[i] - scaled[i] - self.screen_offset[i]
+            if gap > 0:
+                barsize = [0, 0]
+                barsize[i] = gap
+                barsize[1 - i] = self.real_size[1 - i]
+                self.screen_bars[i] = pygame.Surface(barsize).convert()
 
     def fill_background(self, color):
         self.bgsurface.fill(color)
         for x in self.screen_bars:
             if x is not None:
                 x.fill(color)
+        self.full_redraw = True
 
     def set_caption(self, caption):
         pygame.display.set_caption(caption)
@@ -239,18 +347,37 @@ class World:
 
     def blit(self, surf, pos=(0, 0), area=None):
         if surf is None: return
-        surf = pygame.transform.smoothscale(
-            surf, [int(x * self.sys.etc.zoom)
-                   for x in surf.get_size()])
-        if area is not None:
-            area.width *= self.sys.etc.zoom
-            area.height *= self.sys.etc.zoom
+        if self.canvas is not None:
+            self.canvas.blit(surf, pos, area)
+            return
+        zoom = self.sys.etc.zoom
+        if zoom != 1:
+            surf = self.scale_cache.get(surf, zoom)
+            if area is not None:
+                area = pygame.Rect(area)
+                area = pygame.Rect(int(area.x * zoom), int(area.y * zoom),
+                                   int(area.width * zoom),
+                                   int(area.height * zoom))
         self.screen.blit(surf, [self.screen_offset[i] + pos[i] *
-                                self.sys.etc.zoom for i in range(2)], area)
+                                zoom for i in range(2)], area)
 
     def flip(self):
         pygame.display.flip()
 
+    def redraw(self, event=None):
+        self.full_redraw = True
+
+    def get_screen_rect(self, rect):
+        zoom = self.sys.etc.zoom
+        x = int(self.screen_offset[0] + rect.x * zoom)
+        y = int(self.screen_offset[1] + rect.y * zoom)
+        srect = pygame.Rect(
+            x, y,
+            int(math.ceil(self.screen_offset[0] + rect.right * zoom)) - x,
+            int(math.ceil(self.screen_offset[1] + rect.bottom * zoom)) - y)
+        return srect.clip(self.screen_offset,
+                          [int(math.ceil(s * zoom)) for s in self.size])
+
     def lock_keys(self):
         self.keys_locked = True
 
@@ -269,10 +396,8 @@ class World:
     def add_character(self, char):
         self.sys.emit_signal('beforecharacteradd', char)
         self.characters.append(char)
-        counter = TimeCounter(char, char.next_step)
-        self.counters.append(counter)
-        if self.running:
-            counter.start()
+        self.invalidate_render_list()
+        self.add_counter(char, char.next_step)
         self.sys.emit_signal('aftercharacteradd', char)
 
     def create_msgbox(self, **oargs):
@@ -307,12 +432,10 @@ class World:
 
     def lead_walk(self, event):
         if event.type == KEYDOWN:
-            self.keys_down.append(event.key)
+            if event.key not in self.keys_down:
+                self.keys_down[event.key] = True
         elif event.type == KEYUP:
-            try:
-                self.keys_down.remove(event.key)
-            except ValueError:
-                pass
+            self.keys_down.pop(event.key, None)
 
         if not self.keys_locked:
             self.leading_character_direction = \
@@ -320,45 +443,24 @@ class World:
         else:
             self.leading_character_direction = None
 
-    def get_value_of_key_dict(self, keydict):
-        result = None
-        result_key_numbers = None
-        result_points = None
-        for value, keys in keydict.items():
-            p = []
-            tp = 0
-            tn = 0
-            ok = True
-            for k in keys:
-                i = 0
-                ok = False
-                for d in self.keys_down:
-                    if k == d:
-                        tp += i
-                        tn += 1
-                        ok = True
-                        break
-                    i += 1
-                if not ok:
-                    break
-            if ok:
-                if result_key_numbers is not None:
-                    tngo = tn > result_key_numbers
-                    tn2go = tn == result_key_numbers
-                else:
-                    tngo = True
-                if not tngo:
-                    if result_points is not None:
-                        tpgo = tp < result_points
-                    else:
-                        tpgo = True
-
-                if tngo or (tn2go and tpgo):
-                    result = value
-                    result_points = tp
-                    result_key_numbers = tn
+    def set_character_moving_keys(self, keydict):
+        # Also call this after changing the dictionary itself, as the
+        # directions are looked up in a table made from it here
+        self.character_moving_keys = keydict
+        self.key_table = KeyTable(keydict)
+
+    def get_key_table(self, keydict):
+        table = self.key_table
+        if table.keydict is not keydict:
+            # A new dictionary assigned to character_moving_keys, or
+            # some other dictionary
+            table = KeyTable(keydict)
+            if keydict is self.character_moving_keys:
+                self.key_table = table
+        return table
 
-        return result
+    def get_value_of_key_dict(self, keydict):
+        return self.get_key_table(keydict).get(self.keys_down)
 
     def remove_character(self, char):
         if 'id' not in dir(char):
@@ -371,20 +473,35 @@ class World:
 
         self.sys.emit_signal('beforecharacterremove', char)
         self.characters.remove(char)
+        self.invalidate_render_list()
         self.remove_counter(char)
         self.sys.emit_signal('aftercharacterremove', char)
         return True
 
+    def add_timer(self, duration, func, *args, **oargs):
+        # duration is in microseconds of game time, or an object with
+        # a duration attribute. Give repeat=True to have the timer
+        # start over every time it runs out.
+        return self.timers.add(duration, func, *args, **oargs)
+
+    def cancel_timer(self, timer):
+        self.timers.cancel(timer)
+
+    def reschedule_timer(self, timer, duration=None):
+        self.timers.reschedule(timer, duration)
+
+    def add_counter(self, obj, func):
+        timer = self.add_timer(obj, func, repeat=True)
+        self.counters.append(timer)
+        return timer
+
     def remove_counter(self, obj):
-        try:
-            self.counters.remove(obj)
-            return True
-        except Exception:
-            for t in self.counters:
-                if t.obj == obj:
-                    self.counters.remove(t)
-                    return True
-            return False
+        for t in self.counters:
+            if t is obj or t.duration is obj:
+                self.cancel_timer(t)
+                self.counters.remove(t)
+                return True
+        return False
 
     def create_sound(self, path):
         self.sys.emit_signal('beforesoundcreate', self, path)
@@ -430,6 +547,13 @@ class World:
                 self.current_place = self.places[place]
             except IndexError:
                 pass
+        if self.current_place is None:
+            return
+        if self.prefetcher is not None:
+            self.prefetcher.visit(self.current_place)
+        self.image_cache.pin(os.path.abspath(o.imgfile)
+                             for o in self.current_place.objects
+                             if getattr(o, 'imgfile', None) is not None)
         if self.leading_character is None:
             return
 
@@ -457,6 +581,8 @@ class World:
         self.leading_character.original_position = npos
         self.leading_character.position = npos[:]
         self.leading_character.modified_position = npos[:]
+        self.leading_character.previous_position = \
+            self.leading_character.modified_position
 
         newbgsnds = self.current_place.bgsounds
         for x in curbgsnds:
@@ -472,70 +598,354 @@ class World:
     def set_default_msgbox(self, msgbox):
         self.default_msgbox = msgbox
 
+    def invalidate_render_list(self):
+        self.render_place = None
+
+    def get_sorted_drawables(self):
+        # The render list is only built from scratch when the place or
+        # the drawables change; otherwise only characters that have
+        # moved to another depth are moved in it.
+        place = self.current_place
+        count = len(self.characters) + len(place.objects) + \
+            len(self.objects)
+        if place is not self.render_place or count != self.render_count:
+            objs = self.characters[:]
+            objs.extend(place.objects)
+            objs.extend(self.objects)
+            self.render_list.rebuild(objs, lambda o: o.get_bottom_area()[1])
+            self.render_place = place
+            self.render_count = count
+        else:
+            for c in self.characters:
+                self.render_list.move(c, c.get_bottom_area()[1])
+        return self.render_list.items
+
+    def draw_screen_bars(self):
+        if self.screen_bars[0] is not None:
+            self.screen.blit(self.screen_bars[0],
+                             (self.screen_offset[0] -
+                              self.screen_bars[0].get_size()[0], 0))
+            self.screen.blit(self.screen_bars[0],
+                             (self.real_size[0] -
+                              self.screen_bars[0].get_size()[0], 0))
+        if self.screen_bars[1] is not None:
+            self.screen.blit(self.screen_bars[1],
+                             (0, self.screen_offset[1] -
+                              self.screen_bars[1].get_size()[1]))
+            self.screen.blit(self.screen_bars[1],
+                             (0, self.real_size[1] -
+                              self.screen_bars[1].get_size()[1]))
+
+    def scale_canvas(self):
+        if self.canvas is None:
+            return
+        if self.sys.etc.compose == 'nearest':
+            pygame.transform.scale(self.canvas, self.canvas_area.get_size(),
+                                   self.canvas_area)
+        else:
+            pygame.transform.smoothscale(self.canvas,
+                                         self.canvas_area.get_size(),
+                                         self.canvas_area)
+
     def draw(self):
-        self.screen.blit(self.bgsurface, (0, 0))
+        if self.sys.etc.dirtyrects:
+            return self.draw_dirty()
+        prof = self.profiler
+        self.target.blit(self.bgsurface, (0, 0))
         if self.current_place is None:
             return
         self.current_place.draw()
+        if prof is not None: prof.lap('place')
 
-        objs = self.characters[:]
-        objs.extend(self.current_place.objects)
-        objs.extend(self.objects)
-        objs.sort(key=lambda o: o.get_bottom_area()[1])
+        objs = self.get_sorted_drawables()
         for x in objs:
             if x.visible:
                 x.draw()
+        if prof is not None:
+            prof.sprites = len(objs)
+            prof.lap('sprites')
 
         for x in self.msgboxes:
             x.draw()
+        if prof is not None: prof.lap('msgboxes')
 
-        if self.screen_bars[0] is not None:
-            self.screen.blit(self.screen_bars[0], (0, 0))
-            self.screen.blit(self.screen_bars[0],
-                             (self.real_size[0] -
-                              self.screen_bars[0].get_size()[0], 0))
-        if self.screen_bars[1] is not None:
-            self.screen.blit(self.screen_bars[1], (0, 0))
-            self.screen.blit(self.screen_bars[1],
-                             (0, self.real_size[1] -
-                              self.screen_bars[1].get_size()[1]))
-
+        self.scale_canvas()
+        self.draw_screen_bars()
+        if prof is not None:
+            prof.lap('scale')
+            self.draw_hud()
         pygame.display.flip()
+        if prof is not None: prof.lap('present')
+
+    def draw_hud(self):
+        if self.hud is not None:
+            self.hud.draw(self.screen, self.profiler)
+            self.profiler.lap('other')
+
+    def draw_dirty(self):
+        # Only redraw (and update) the parts of the screen covered by
+        # drawables that have moved, changed or disappeared since the
+        # last frame.
+        if self.current_place is None:
+            self.target.blit(self.bgsurface, (0, 0))
+            return
+
+        prof = self.profiler
+        if self.hud is not None:
+            # The overlay covers whatever was below it last time
+            self.full_redraw = True
+        objs = self.get_sorted_drawables()
+        if prof is not None: prof.sprites = len(objs)
+        conts = []
+        for x in self.msgboxes:
+            conts.extend(x.msgcontainers)
+        states = {}
+        for x in objs + conts:
+            state = x.get_draw_state()
+            if state is not None:
+                states[x] = state
+
+        if self.full_redraw or self.drawn_place is not self.current_place:
+            self.target.blit(self.bgsurface, (0, 0))
+            self.current_place.draw()
+            if prof is not None: prof.lap('place')
+            for x in objs:
+                if x in states:
+                    x.draw()
+            if prof is not None: prof.lap('sprites')
+            for x in conts:
+                if x in states:
+                    x.draw()
+            if prof is not None: prof.lap('msgboxes')
+            self.scale_canvas()
+            self.draw_screen_bars()
+            if prof is not None:
+                prof.lap('scale')
+                self.draw_hud()
+            pygame.display.flip()
+            if prof is not None: prof.lap('present')
+        else:
+            dirty = []
+            for x, state in states.items():
+                old = self.draw_states.get(x)
+                if old != state:
+                    dirty.append(state[0])
+                    if old is not None:
+                        dirty.append(old[0])
+            for x, old in self.draw_states.items():
+                if x not in states:
+                    dirty.append(old[0])
+
+            rects = []
+            for r in merge_rects([d.inflate(2, 2) for d in dirty]):
+                srect = self.get_screen_rect(r)
+                if self.canvas is None:
+                    trect = srect
+                else:
+                    trect = r.clip(self.canvas.get_rect())
+                self.target.set_clip(trect)
+                self.target.blit(self.bgsurface, trect, trect)
+                self.current_place.draw()
+                r = r.inflate(2, 2)
+                for x in objs + conts:
+                    if x in states and r.colliderect(states[x][0]):
+                        x.draw()
+                rects.append(srect)
+            self.target.set_clip(None)
+            # Partial redraws count as drawing sprites
+            if prof is not None: prof.lap('sprites')
+            if rects:
+                self.scale_canvas()
+                if prof is not None: prof.lap('scale')
+                pygame.display.update(rects)
+                if prof is not None: prof.lap('present')
+
+        self.draw_states = states
+        self.drawn_place = self.current_place
+        self.full_redraw = False
+
+    def get_time(self):
+        return self.time
+
+    def get_draw_time(self):
+        # The time of the game at the frame being drawn, which is a
+        # bit after the last step
+        return self.time + self.lag
+
+    def get_walking_duration(self):
+        try:
+            return self.walking_speed.duration
+        except AttributeError:
+            return self.walking_speed
+
+    def update(self, tick):
+        # One fixed step of the game
+        self.time += tick
+        self.timers.run()
 
     def run(self):
         self.sys.emit_signal('beforeworldrun', self)
         self.status('Running...')
         self.running = True
-
-        for c in self.counters:
-            c.start()
-
+        # Everything preloaded has been used by now
+        self.loader.finish()
+        if self.sys.etc.atlas == 'game':
+            self.atlas = pack_frames(get_frames(self.characters))[0]
+            self.status('Packed character frames into %d atlas pages \
+using %d bytes' % (len(self.atlas.pages), self.atlas.get_bytes()))
+
+        # The game advances in fixed steps of simulated time, while
+        # frames are drawn as often as --fps allows. Walking
+        # characters are drawn between their last two positions.
+        self.tick = 1000000.0 / self.sys.etc.tickrate
+        self.lag = 0.0
+        self.frame_count = 0
+        self.frame_times = []
+        headless = self.sys.etc.headless
         while not self.quitting:
-            self.innerclock.tick(30)
-            self.sys.emit_signal('beforegameloop', self)
-
-            for event in pygame.event.get():
-                self.event[event.type] = event
-                self.sys.emit_event(event.type, event)
-
-            for c in self.counters:
-                c.think()
-
-            self.draw()
-            self.sys.emit_signal('aftergameloop', self)
+            if headless is None:
+                self.frame()
+                continue
+            started = time.time()
+            self.frame()
+            self.end_headless_frame(time.time() - started)
+            if self.frame_count >= headless:
+                self.quitting = True
 
         self.sys.emit_signal('afterworldrun', self)
 
+    def frame(self):
+        prof = self.profiler
+        if prof is not None: prof.begin_frame()
+        self.innerclock.tick(self.sys.etc.fps)
+        self.lag += min(self.innerclock.get_time() * 1000, MAX_FRAME_TIME)
+        self.sys.emit_signal('beforegameloop', self)
+        if prof is not None: prof.lap('other')
+
+        for event in self.get_events():
+            self.event[event.type] = event
+            self.sys.emit_event(event.type, event)
+        if prof is not None: prof.lap('events')
+
+        while self.lag >= self.tick:
+            self.update(self.tick)
+            self.lag -= self.tick
+
+        if self.prefetcher is not None:
+            self.prefetcher.collect()
+        if prof is not None: prof.lap('update')
+        self.draw()
+        self.sys.emit_signal('aftergameloop', self)
+        self.frame_count += 1
+        if prof is not None and self.sys.etc.profile:
+            self.report_profile()
+
+    def report_profile(self):
+        now = time.time()
+        if self.profile_reported is None:
+            self.profile_reported = now
+        elif now - self.profile_reported >= self.sys.etc.profileinterval:
+            self.profile_reported = now
+            self.status(self.profiler.get_summary())
+
+    def toggle_profiler_hud(self):
+        # Showing the overlay starts profiling if --profile has not
+        if self.hud is None:
+            if self.profiler is None:
+                self.profiler = Profiler()
+            self.hud = ProfilerHUD(self)
+        else:
+            self.hud = None
+            if not self.sys.etc.profile:
+                self.profiler = None
+        self.full_redraw = True
+
+    def get_events(self):
+        if not self.sys.etc.allevents:
+            self.sys.gameactions.update_filter()
+        events = pygame.event.get()
+        if self.replayer is not None:
+            # Only closing the window still works while replaying
+            quits = [e for e in events if e.type == QUIT]
+            if self.replayer.finished:
+                self.quitting = True
+            events = self.replayer.get_events() + quits
+        if self.recorder is not None:
+            self.recorder.record(self.innerclock.get_time(), events)
+        return events
+
+    def end_headless_frame(self, seconds):
+        # Frame times are written to standard output as tab-separated
+        # frame numbers and milliseconds
+        self.frame_times.append(seconds)
+        print '%d\t%.3f' % (self.frame_count, seconds * 1000)
+        if self.sys.etc.dumpframes is not None:
+            pygame.image.save(self.screen, os.path.join(
+                    self.sys.etc.dumpframes,
+                    'frame%06d.png' % self.frame_count))
+
     def quit(self, event):
         self.quitting = True
 
+    def link_trigger(self, obj):
+        # Objects requiring an event are not linked one by one. The
+        # event is only given to the objects of the current place that
+        # the leading character is close to.
+        key = tuple(obj.require_event[:2])
+        if key not in self.triggers:
+            self.triggers.add(key)
+            self.link_key_event(key[0], key[1], self.run_triggers)
+
+    def run_triggers(self, event):
+        place = self.current_place
+        if place is None or not place.touching:
+            return
+        objs = [o for o in place.touching
+                if getattr(o, 'close_to_touch', False) and
+                o.require_event[0] == event.type]
+        objs.sort(key=lambda o: place.object_order.get(o, 0))
+        for o in objs:
+            o.event_check(event)
+
     def key_builtin(self, event):
         if event.key == K_SCROLLOCK:
             self.leading_character.reset_position()
         if event.key == K_ESCAPE:
             self.quit(event)
+        if event.key == K_F12:
+            self.toggle_profiler_hud()
 
     def end(self):
         self.sys.emit_signal('beforeworldend', self)
         self.status('Stopping...')
+        if self.sys.etc.zoom != 1:
+            self.status('Zoom cache: %(hits)d hits, %(misses)d misses, \
+%(evictions)d evictions, %(entries)d entries using %(bytes)d bytes' %
+                        self.scale_cache.stats())
+        self.status('Image cache: %(hits)d hits, %(misses)d misses, \
+%(evictions)d evictions, %(entries)d entries (%(pinned)d pinned) using \
+%(bytes)d bytes' % self.image_cache.stats())
+        self.status('Frame cache: %(hits)d hits, %(misses)d misses, \
+%(entries)d entries using %(bytes)d bytes' % self.frame_cache.stats())
+        self.loader.stop()
+        if self.profiler is not None and self.profiler.count:
+            self.status('Profile of the last frames: ' +
+                        self.profiler.get_summary())
+        if self.recorder is not None:
+            self.recorder.close()
+            self.status('Recorded %d frames to %s' %
+                        (self.recorder.frames, self.sys.etc.record))
+        if self.replayer is not None:
+            self.replayer.close()
+        if self.frame_times:
+            times = sorted(self.frame_times)
+            self.status('Drew %d frames in %.3f seconds: %.3f ms at least, \
+%.3f ms on average, %.3f ms at most' % (
+                    len(times), sum(times), times[0] * 1000,
+                    sum(times) / len(times) * 1000, times[-1] * 1000))
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+            self.status('Prefetching: %(prefetched)d places prefetched, \
+%(used)d revisited, %(evictions)d evictions, %(entries)d places held \
+using %(bytes)d bytes' % self.prefetcher.stats())
         self.sys.emit_signal('afterworldend', self)